@@ -2,6 +2,7 @@ import sys
 import os
 import time
 import csv
+import codecs
 import llama_cpp  
 from docx import Document  
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
@@ -35,11 +36,91 @@ class ModelLoader(QThread):
             self.signals.progress_updated.emit(0)
             self.signals.model_loaded.emit(False)
 
+def common_prefix_length(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+class ChatSession:
+    """以token列表保存整段对话，每轮只把新消息分词后接在末尾。
+    llama.cpp 生成时按最长公共前缀复用KV缓存，只评估新增的token，首字耗时不随对话变长而增加"""
+    INSTRUCTION = "请用中文回答，先输出思考过程，再用`</think>`分隔，最后输出最终回答（单行）："
+    STOP = ["\nUser:", "\nAssistant:"]
+    def __init__(self, model, max_tokens=1024):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.turns = []  # 每段内容（文件、用户消息、回答）的token列表
+        self.evaluated = []  # KV缓存中已经评估过的token
+        self.new_tokens = 0
+        self.first_token_seconds = None
+    def reset(self):
+        self.turns = []
+    def tokenize(self, text):
+        return self.model.tokenize(text.encode("utf-8"), add_bos=False)
+    def add_context(self, text):
+        self.turns.append(self.tokenize(text))
+    def prompt_tokens(self):
+        # 超出上下文长度时丢弃最早的内容，这一轮需要重新评估，之后继续复用
+        limit = self.model.n_ctx() - self.max_tokens - 1
+        while len(self.turns) > 1 and sum(len(turn) for turn in self.turns) > limit:
+            self.turns.pop(0)
+        return [self.model.token_bos()] + [token for turn in self.turns for token in turn]
+    def held_back(self, text):
+        # 末尾可能是停止串的开头，先不输出
+        return max((n for stop in self.STOP for n in range(1, len(stop)) if text.endswith(stop[:n])), default=0)
+    def generate(self, user_message, should_stop=lambda: False, temperature=0.7):
+        """逐段产出回答文本；结束或取消后，回答的token留在对话中供下一轮复用"""
+        self.turns.append(self.tokenize(f"User: {self.INSTRUCTION}{user_message}\nAssistant:"))
+        prompt = self.prompt_tokens()
+        self.new_tokens = len(prompt) - common_prefix_length(self.evaluated, prompt)
+        self.first_token_seconds = None
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        eos = self.model.token_eos()
+        generated = []
+        reply = []
+        ends = []  # 每个回答token结束处在文本中的位置
+        text = ""
+        emitted = 0
+        start = time.perf_counter()
+        try:
+            for token in self.model.generate(prompt, temp=temperature):
+                if self.first_token_seconds is None:
+                    self.first_token_seconds = time.perf_counter() - start
+                generated.append(token)
+                if token == eos or should_stop():
+                    break
+                text += decoder.decode(self.model.detokenize([token]))
+                reply.append(token)
+                ends.append(len(text))
+                stops = [i for i in (text.find(stop) for stop in self.STOP) if i >= 0]
+                if stops:
+                    # 只保留停止串之前的token
+                    text = text[:min(stops)]
+                    while ends and ends[-1] > len(text):
+                        ends.pop()
+                        reply.pop()
+                    break
+                safe = len(text) - self.held_back(text)
+                if safe > emitted:
+                    yield text[emitted:safe]
+                    emitted = safe
+                if len(reply) >= self.max_tokens:
+                    break
+            if len(text) > emitted:
+                yield text[emitted:]
+        finally:
+            # 最后产出的token还没有被评估
+            self.evaluated = prompt + generated[:-1]
+            self.turns.append(reply + self.tokenize("\n"))
+
 class InferenceWorker(QThread):
-    def __init__(self, model, prompt):
+    def __init__(self, session, user_message):
         super().__init__()
-        self.model = model
-        self.prompt = prompt
+        self.session = session
+        self.user_message = user_message
         self.signals = WorkerSignals()
         self.stop_flag = False
     def run(self):
@@ -48,22 +129,21 @@ class InferenceWorker(QThread):
             self.signals.progress_updated.emit(0)
             progress = 0
             full_response = ""
-            for token in self.model.create_completion(
-                self.prompt, stream=True, max_tokens=1024, 
-                temperature=0.7, stop=["\nUser:", "\nAssistant:"]
-            ):
-                if self.stop_flag:
-                    self.signals.status_updated.emit("生成已取消")
-                    return
-                token_text = token["choices"][0]["text"].replace("\n", " ").replace("  ", " ")
+            for text in self.session.generate(self.user_message, lambda: self.stop_flag):
+                token_text = text.replace("\n", " ").replace("  ", " ")
                 full_response += token_text
                 self.signals.result_ready.emit(token_text)
                 progress += 1
                 if progress > 100: progress = 100
                 self.signals.progress_updated.emit(progress)
                 time.sleep(0.005)
+            if self.stop_flag:
+                self.signals.status_updated.emit("生成已取消")
+                return
             self.signals.progress_updated.emit(100)
-            self.signals.status_updated.emit("回答生成完成")
+            self.signals.status_updated.emit(
+                f"回答生成完成（首字 {self.session.first_token_seconds or 0:.2f} 秒，"
+                f"本轮评估 {self.session.new_tokens} 个新token）")
         except Exception as e:
             self.signals.status_updated.emit(f"生成失败: {str(e)}")
             self.signals.progress_updated.emit(0)
@@ -103,6 +183,7 @@ class AIChatWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.model = None
+        self.session = None
         self.inference_worker = None
         self.ai_prefix_added = False
         self.full_response = ""
@@ -383,6 +464,7 @@ class AIChatWindow(QMainWindow):
     def on_model_loaded(self, success):
         if success:
             self.model = self.model_loader.model
+            self.session = ChatSession(self.model)
             QMessageBox.information(self, "成功", "模型加载成功")
             self.send_btn.setEnabled(True)
         else:
@@ -413,9 +495,12 @@ class AIChatWindow(QMainWindow):
         self.chat_history.append(f"📎 已加载文件: {file_name}\n")
         if len(file_content) > 1000:
             display_content = file_content[:1000] + "..."
-            self.chat_history.append(f"文件内容预览:\n{display_content}\n")
+            context = f"文件内容预览:\n{display_content}\n"
         else:
-            self.chat_history.append(f"文件内容:\n{file_content}\n")
+            context = f"文件内容:\n{file_content}\n"
+        self.chat_history.append(context)
+        # 文件内容只在这里分词一次，之后每轮对话都复用它的KV缓存
+        self.session.add_context(f"已加载文件: {file_name}\n{context}")
         self.user_input.setPlainText("请分析一下这个文件，告诉我其中的关键信息（用中文回答）。")
     
     def send_message(self):
@@ -435,12 +520,11 @@ class AIChatWindow(QMainWindow):
         # 禁用按钮
         self.send_btn.setEnabled(False)
         self.upload_file_btn.setEnabled(False)
+        # 生成结束时会把回复追加到会话，生成期间不能清空
+        self.clear_btn.setEnabled(False)
         self.cancel_btn.setEnabled(True)
-        # 构建提示词
-        history_text = self.chat_history.toPlainText().replace("👤 你:", "User:").replace("🤖 AI:", "Assistant:")
-        prompt = f"{history_text}User: 请用中文回答，先输出思考过程，再用`</think>`分隔，最后输出最终回答（单行）：{user_message}Assistant:"
-        # 启动推理线程
-        self.inference_worker = InferenceWorker(self.model, prompt)
+        # 启动推理线程，对话内容由 ChatSession 以token形式保存
+        self.inference_worker = InferenceWorker(self.session, user_message)
         self.inference_worker.signals.progress_updated.connect(self.update_progress)
         self.inference_worker.signals.status_updated.connect(self.update_status)
         self.inference_worker.signals.result_ready.connect(self.append_model_response)
@@ -502,6 +586,7 @@ class AIChatWindow(QMainWindow):
         self.chat_history.append("\n")
         self.send_btn.setEnabled(True)
         self.upload_file_btn.setEnabled(True)
+        self.clear_btn.setEnabled(True)
         self.cancel_btn.setEnabled(False)
         self.inference_worker = None
     
@@ -513,7 +598,11 @@ class AIChatWindow(QMainWindow):
             self.thoughts_finished = False
     
     def clear_chat(self):
+        if self.inference_worker and self.inference_worker.isRunning():
+            return
         self.chat_history.clear()
+        if self.session:
+            self.session.reset()
         self.file_path_edit.clear()
         self.ai_prefix_added = False
         self.thoughts_finished = False
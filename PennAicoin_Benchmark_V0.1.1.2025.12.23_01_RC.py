@@ -0,0 +1,622 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import wave
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+
+
+# 被测程序：与本脚本放在同一目录下的主程序
+APP_FILE = "PennAicoin_V0.1.1.2025.12.23_01_RC.py"
+# 随程序提供的语音记账测试集
+VOICE_CORPUS = os.path.join("resources", "voice_corpus", "corpus.json")
+EXTRACT_FIELDS = ('date', 'amount', 'currency', 'type', 'category')
+
+
+def load_app():
+    """按文件路径加载主程序模块（文件名中含有点号，无法直接 import）"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), APP_FILE)
+    spec = importlib.util.spec_from_file_location("pennaicoin_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_size(text):
+    """把 1M、512K、2G 这样的写法转换为字节数"""
+    text = text.strip().upper()
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit, factor in (('G', 1 << 30), ('M', 1 << 20), ('K', 1 << 10)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def peak_rss():
+    """当前进程的峰值常驻内存（字节），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以KB为单位，macOS 以字节为单位
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    except ImportError:
+        return None
+
+
+def timed(func, repeat=1):
+    """运行 repeat 次，返回最短耗时（秒）和最后一次的返回值"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def machine_info():
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'app': APP_FILE,
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    }
+
+
+def bench_kdf(app, iteration_sets, repeat):
+    """PBKDF2 派生耗时，对应每次输入密码的固定开销"""
+    manager = app.EncryptionManager()
+    results = []
+    for iterations in iteration_sets:
+        seconds, _ = timed(lambda: manager.derive_key_encryption_key("benchmark", os.urandom(16), iterations), repeat)
+        results.append({'iterations': iterations, 'seconds': seconds})
+        print(f"KDF pbkdf2-sha256 {iterations:>8} 次迭代: {seconds * 1000:.1f} ms")
+    return results
+
+
+def bench_rsa(app, repeat):
+    """RSA 密钥生成以及数据密钥的包装/解包装耗时"""
+    manager = app.EncryptionManager()
+    keygen_seconds, (private_key, public_key) = timed(manager.generate_rsa_key_pair, repeat)
+    data_key = manager.generate_data_key()
+    wrap_seconds, wrapped = timed(lambda: public_key.encrypt(data_key, manager.rsa_padding()), repeat * 10)
+    unwrap_seconds, _ = timed(lambda: private_key.decrypt(wrapped, manager.rsa_padding()), repeat * 10)
+    print(f"RSA-2048 生成: {keygen_seconds * 1000:.1f} ms, 包装: {wrap_seconds * 1000:.2f} ms, "
+          f"解包装: {unwrap_seconds * 1000:.2f} ms")
+    return {'key_size': 2048, 'keygen_seconds': keygen_seconds,
+            'wrap_seconds': wrap_seconds, 'unwrap_seconds': unwrap_seconds}
+
+
+def bench_aes(app, sizes, chunk_size):
+    """AES 加解密吞吐量：按归档数据块大小分块处理，避免一次性分配整段内存"""
+    manager = app.EncryptionManager()
+    key = manager.generate_data_key()
+    block = os.urandom(chunk_size)
+    iv, encrypted_block = manager.encrypt_chunk(block, key)
+    results = []
+    for size in sizes:
+        count = max(1, size // chunk_size)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            manager.encrypt_chunk(block, key)
+        encrypt_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(count):
+            manager.decrypt_chunk(encrypted_block, key, iv)
+        decrypt_seconds = time.perf_counter() - start
+
+        megabytes = count * chunk_size / (1 << 20)
+        result = {
+            'size': size,
+            'chunk_size': chunk_size,
+            'encrypt_mb_s': megabytes / encrypt_seconds,
+            'decrypt_mb_s': megabytes / decrypt_seconds
+        }
+        results.append(result)
+        print(f"AES-256-CBC {format_size(size):>5}: 加密 {result['encrypt_mb_s']:.0f} MB/s, "
+              f"解密 {result['decrypt_mb_s']:.0f} MB/s")
+    return results
+
+
+def build_ledger(app, db_path, size):
+    """生成大约 size 字节CSV数据量的账本"""
+    row = ('2025-01-01', 35.5, '人民币 (CNY)', '支出', '餐饮', '午饭 公司楼下 面馆')
+    row_bytes = len(','.join(str(value) for value in row).encode('utf-8')) + 8
+    rows = max(1, size // row_bytes)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(app.RECORDS_TABLE_SQL)
+        batch = [row] * 10000
+        for start in range(0, rows, len(batch)):
+            conn.executemany(
+                "INSERT INTO records (date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?)",
+                batch[:min(len(batch), rows - start)]
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+
+def run_end_to_end(size, codec, level):
+    """在独立子进程中运行，保证峰值内存只反映这一次导出/导入"""
+    app = load_app()
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)  # 私钥文件写在当前目录
+        try:
+            rows = build_ledger(app, "source.db", size)
+            conn = sqlite3.connect("target.db")
+            conn.execute(app.RECORDS_TABLE_SQL)
+            conn.close()
+            baseline_rss = peak_rss()
+
+            file_manager = app.FileManager(None)
+            export_seconds, ok = timed(lambda: file_manager.export_to_jzrj("source.db", "archive", "benchmark", codec, level))
+            if not ok:
+                raise RuntimeError("导出失败")
+            export_rss = peak_rss()
+            import_seconds, ok = timed(lambda: file_manager.import_from_jzrj("archive.jzrj", "benchmark", "target.db"))
+            if not ok:
+                raise RuntimeError("导入失败")
+
+            return {
+                'size': size,
+                'rows': rows,
+                'codec': codec,
+                'level': level,
+                'archive_bytes': os.path.getsize("archive.jzrj"),
+                'export_seconds': export_seconds,
+                'import_seconds': import_seconds,
+                'baseline_peak_rss': baseline_rss,
+                'export_peak_rss': export_rss,
+                'import_peak_rss': peak_rss()
+            }
+        finally:
+            os.chdir(cwd)
+
+
+def bench_end_to_end(sizes, codec, level):
+    results = []
+    for size in sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--end-to-end-child", str(size), codec, str(level)],
+            capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(f"端到端测试失败 ({format_size(size)}): {output.stderr.strip()}")
+            continue
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        results.append(result)
+        rss = result['import_peak_rss']
+        rss_text = f", 峰值内存 {rss / (1 << 20):.0f} MB" if rss else ""
+        print(f"导出/导入 {format_size(size):>5} ({result['rows']} 行, {codec}): "
+              f"导出 {result['export_seconds']:.2f} s, 导入 {result['import_seconds']:.2f} s, "
+              f"归档 {result['archive_bytes'] / (1 << 20):.1f} MB{rss_text}")
+    return results
+
+
+def load_corpus(corpus_path):
+    """语音测试集：JSON 列表（或带 items 列表的对象），每项为
+    {"audio": WAV路径（相对测试集文件）, "text": 参考文本, "expected": 应提取出的记录（可选）}"""
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    items = data['items'] if isinstance(data, dict) else data
+    base_dir = os.path.dirname(os.path.abspath(corpus_path))
+    return [dict(item, audio=os.path.join(base_dir, item['audio'])) for item in items]
+
+
+def with_audio(corpus):
+    """只保留录音文件存在的条目"""
+    items = [item for item in corpus if os.path.exists(item['audio'])]
+    if len(items) < len(corpus):
+        print(f"测试集中 {len(corpus) - len(items)} 条缺少录音文件，语音识别测试跳过这些条目")
+    return items
+
+
+def check_voice_inputs(corpus_path, model_path):
+    """语音识别测试需要测试集录音和识别模型，缺少任何一项时报错退出，不把跳过的测试当作通过"""
+    corpus = load_corpus(corpus_path)
+    missing = [item['audio'] for item in corpus if not os.path.exists(item['audio'])]
+    problems = []
+    if missing:
+        problems.append(f"测试集 {corpus_path} 有 {len(missing)}/{len(corpus)} 条缺少录音文件，例如 {missing[0]}")
+    if not os.path.isdir(model_path):
+        problems.append(f"找不到语音识别模型目录 {model_path}")
+    if problems:
+        sys.exit("无法进行语音识别测试:\n  " + "\n  ".join(problems) +
+                 "\n请按 corpus.json 的 audio 字段录制 16kHz 单声道 16 位 WAV 放入测试集目录，"
+                 "或加 --voice-text-only 只测试文本提取")
+
+
+def expected_record(item):
+    """测试集中的期望记录，date_offset 按测试当天换算为日期"""
+    expected = dict(item['expected'])
+    if 'date_offset' in expected:
+        day = time.time() + expected.pop('date_offset') * 86400
+        expected['date'] = time.strftime("%Y-%m-%d", time.localtime(day))
+    return expected
+
+
+def field_accuracy(app, items, texts):
+    """按字段统计提取准确率，texts 为与 items 一一对应的待提取文本"""
+    extractor = app.LedgerExtractor()
+    correct = dict.fromkeys(EXTRACT_FIELDS, 0)
+    exact = 0
+    for item, text in zip(items, texts):
+        record = dict(zip(EXTRACT_FIELDS, extractor.extract_record(text)))
+        expected = expected_record(item)
+        matched = [field for field in EXTRACT_FIELDS
+                   if field in expected and str(record[field]) == str(expected[field])]
+        for field in matched:
+            correct[field] += 1
+        exact += len(matched) == len([field for field in EXTRACT_FIELDS if field in expected])
+    total = len(items) or 1
+    accuracy = {field: correct[field] / total for field in EXTRACT_FIELDS}
+    accuracy['record'] = exact / total
+    return accuracy
+
+
+def bench_extraction(app, corpus_path, engine_utterances=100000):
+    """用参考文本测试提取准确率和耗时，不需要录音和语音模型"""
+    items = [item for item in load_corpus(corpus_path) if 'expected' in item]
+    extractor = app.LedgerExtractor()
+    extractor.extract_record("预热 分词 词典")  # jieba 词典加载不计入耗时
+    seconds, _ = timed(lambda: [extractor.extract_record(item['text']) for item in items], 3)
+    accuracy = field_accuracy(app, items, [item['text'] for item in items])
+    print(f"文本提取: {len(items)} 条, 每条 {seconds / max(1, len(items)) * 1000:.2f} ms, 整条正确率 {accuracy['record'] * 100:.1f}%, "
+          + ", ".join(f"{field} {accuracy[field] * 100:.0f}%" for field in EXTRACT_FIELDS))
+
+    # 提取引擎本身的吞吐量：分词结果预先算好，只计提取
+    prepared = [(item['text'], app.ledger_segmenter.lcut(item['text'])) for item in items]
+    rounds = max(1, engine_utterances // max(1, len(prepared)))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, words in prepared:
+            extractor.extract(text, words)
+    engine_rate = rounds * len(prepared) / (time.perf_counter() - start)
+    print(f"提取引擎: {engine_rate:,.0f} 条/秒（{rounds * len(prepared)} 条）")
+    return {'items': len(items), 'seconds_per_item': seconds / max(1, len(items)), 'accuracy': accuracy,
+            'engine_per_second': engine_rate}
+
+
+def bench_bulk_text(app, corpus_path, lines=5000):
+    """批量文本记账：把测试集文本重复成多行粘贴文本，测一次分词加逐行提取的总耗时"""
+    texts = [item['text'] for item in load_corpus(corpus_path)]
+    pasted = (texts * (lines // max(1, len(texts)) + 1))[:lines]
+    extractor = app.LedgerExtractor()
+    extractor.extract_lines(["预热 分词 词典"])
+    seconds, results = timed(lambda: extractor.extract_lines(pasted), 3)
+    print(f"批量文本: {len(results)} 行, 用时 {seconds * 1000:.0f} ms, {len(results) / seconds:,.0f} 行/秒")
+    return {'lines': len(results), 'seconds': seconds}
+
+
+def bench_category_classifier(app, corpus_path, records=20000):
+    """分类器：用测试集文本和期望分类生成内存账本，测一遍训练的吞吐量和单次预测耗时"""
+    items = [item for item in load_corpus(corpus_path) if item.get('expected', {}).get('category')]
+    rows = [('', 0, '', '', item['expected']['category'], item['text']) for item in items]
+    rows = (rows * (records // max(1, len(rows)) + 1))[:records]
+    conn = sqlite3.connect(':memory:')
+    conn.execute(app.RECORDS_TABLE_SQL)
+    conn.executemany("INSERT INTO records (date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?)", rows)
+    conn.commit()
+    classifier = app.CategoryClassifier(conn)
+    app.ledger_segmenter.get()
+    train_seconds, _ = timed(lambda: classifier.sync(app.ledger_segmenter.lcut))
+    prepared = [app.ledger_segmenter.lcut(item['text']) for item in items]
+    rounds = max(1, 100000 // max(1, len(prepared)))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for words in prepared:
+            classifier.predict(words)
+    predict_us = (time.perf_counter() - start) / (rounds * max(1, len(prepared))) * 1e6
+    conn.close()
+    print(f"分类器: 训练 {len(rows)} 条 {len(rows) / train_seconds:,.0f} 条/秒, 预测每条 {predict_us:.1f} µs")
+    return {'records': len(rows), 'train_per_second': len(rows) / train_seconds, 'predict_us': predict_us}
+
+
+def spoken_number(n, liang=False):
+    """整数的标准中文读法（n < 1亿），liang 为 True 时百/千/万前的二读作“两”"""
+    digits = '零一二三四五六七八九'
+
+    def section(value):
+        text = ''
+        zero = False
+        for power, unit in ((1000, '千'), (100, '百'), (10, '十'), (1, '')):
+            digit = value // power % 10
+            if digit == 0:
+                zero = bool(text)
+                continue
+            if zero:
+                text += '零'
+                zero = False
+            text += ('两' if liang and digit == 2 and unit in '百千' else digits[digit]) + unit
+        return text
+
+    if n == 0:
+        return '零'
+    wan, rest = divmod(n, 10000)
+    text = (section(wan) + '万') if wan else ''
+    if rest:
+        if wan and rest < 1000:
+            text += '零'
+        text += section(rest)
+    if text.startswith('一十'):
+        text = text[1:]
+    return text
+
+
+def bench_numerals(app, count=100000):
+    """大批量生成中文金额和日期说法，检查解析结果并测试解析吞吐量"""
+    extractor = app.LedgerExtractor()
+    phrases = []
+    for i in range(count):
+        # 金额分布在 1 ~ 1亿 之间，一半按识别结果的样子在字之间加空格，一部分带“块 X 毛”
+        value = (i * 7919) % 100000000 + 1
+        text = spoken_number(value, liang=i % 3 == 0)
+        expected = float(value)
+        if i % 4 == 1:
+            jiao = i % 10
+            text += f"块{'零一二三四五六七八九'[jiao]}毛" if jiao else "块"
+            expected += jiao / 10
+        if i % 2:
+            text = ' '.join(text)
+        phrases.append(("amount", text, round(expected, 2)))
+    # 没说年份的日期指过去一年内的日子
+    today = app.datetime.date.today()
+    for offset in range(365):
+        day = today - app.datetime.timedelta(days=offset)
+        text = f"{spoken_number(day.month)}月{spoken_number(day.day)}号"
+        phrases.append(("date", text, day.isoformat()))
+
+    errors = []
+    start = time.perf_counter()
+    for field, text, expected in phrases:
+        record = extractor.extract(text, ())
+        value = record.amount if field == "amount" else record.date
+        if value != expected:
+            errors.append((text, expected, value))
+    seconds = time.perf_counter() - start
+    for text, expected, value in errors[:5]:
+        print(f"  解析错误: {text} -> {value}，应为 {expected}")
+    print(f"数字/日期解析: {len(phrases)} 条, 错误 {len(errors)} 条, {len(phrases) / seconds:,.0f} 条/秒")
+    return {'phrases': len(phrases), 'errors': len(errors), 'per_second': len(phrases) / seconds}
+
+
+def replay_file(app, model_path, audio_path, realtime):
+    """通过 VoiceRecognition 完整链路回放一个录音文件（包括端点检测），返回识别文本"""
+    texts = []
+    worker = app.VoiceRecognition(model_path, timeout=600, vad=True, partial_interval=None,
+                                  audio_source=app.WavFileSource(audio_path, realtime=realtime))
+    worker.recognized_text.connect(texts.append)
+    worker.run()  # 在当前线程中直接运行，信号同步投递
+    return ' '.join(text for text in texts if text)
+
+
+def bench_voice_replay(app, corpus_path, model_path, realtime=False):
+    """回放测试集录音，测试识别吞吐量（音频时长/耗时）以及识别文本的提取准确率"""
+    items = with_audio([item for item in load_corpus(corpus_path) if 'expected' in item])
+    if not items:
+        return None
+    from PySide6.QtCore import QCoreApplication
+    qt_app = QCoreApplication.instance() or QCoreApplication([])  # QThread 需要应用实例，保持引用直到测试结束
+    app.voice_models.get_model(model_path)
+    app.voice_timings.log_path = None  # 测试不写入耗时日志
+    texts = []
+    errors = characters = 0
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    for item in items:
+        text = replay_file(app, model_path, item['audio'], realtime)
+        edits, length = char_error_rate(item['text'], text)
+        errors += edits
+        characters += length
+        with wave.open(item['audio'], 'rb') as wf:
+            audio_seconds += wf.getnframes() / wf.getframerate()
+        texts.append(text)
+    seconds = time.perf_counter() - start
+    accuracy = field_accuracy(app, items, texts)
+    result = {
+        'items': len(items),
+        'realtime': realtime,
+        'audio_seconds': audio_seconds,
+        'seconds': seconds,
+        'speed': audio_seconds / seconds if seconds else None,
+        'cer': errors / characters if characters else None,
+        'accuracy': accuracy,
+        'timings': app.voice_timings.summary()
+    }
+    print(f"回放识别: {len(items)} 条, {result['speed']:.1f} 倍实时, 字错误率 {(result['cer'] or 0) * 100:.1f}%, "
+          f"整条正确率 {accuracy['record'] * 100:.1f}%")
+    return result
+
+
+def char_error_rate(reference, hypothesis):
+    """字错误率：去掉空格后按字计算编辑距离"""
+    reference = reference.replace(' ', '')
+    hypothesis = hypothesis.replace(' ', '')
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1], len(reference)
+
+
+def decode_wav(app, model_path, audio_path, grammar):
+    """整段送入识别器，返回识别文本、解码耗时和音频时长"""
+    with wave.open(audio_path, 'rb') as wf:
+        sample_rate = wf.getframerate()
+        audio_seconds = wf.getnframes() / sample_rate
+        recognizer = app.voice_models.create_recognizer(model_path, sample_rate, grammar)
+        texts = []
+        start = time.perf_counter()
+        while True:
+            data = wf.readframes(4000)
+            if not data:
+                break
+            if recognizer.AcceptWaveform(data):
+                texts.append(json.loads(recognizer.Result()).get('text', ''))
+        texts.append(json.loads(recognizer.FinalResult()).get('text', ''))
+        seconds = time.perf_counter() - start
+    return ' '.join(text for text in texts if text), seconds, audio_seconds
+
+
+def bench_voice_grammar(app, corpus_path, model_path):
+    """在测试集上对比自由识别和受限识别的解码速度（实时率）与字错误率"""
+    corpus = with_audio(load_corpus(corpus_path))
+    if not corpus:
+        return []
+    app.voice_models.get_model(model_path)  # 模型加载时间不计入解码耗时
+    results = []
+    for mode, grammar in (('free', None), ('grammar', app.build_ledger_grammar())):
+        errors = characters = 0
+        decode_seconds = audio_seconds = 0.0
+        for item in corpus:
+            text, seconds, duration = decode_wav(app, model_path, item['audio'], grammar)
+            edits, length = char_error_rate(item['text'], text)
+            errors += edits
+            characters += length
+            decode_seconds += seconds
+            audio_seconds += duration
+        result = {
+            'mode': mode,
+            'utterances': len(corpus),
+            'audio_seconds': audio_seconds,
+            'decode_seconds': decode_seconds,
+            'rtf': decode_seconds / audio_seconds if audio_seconds else None,
+            'cer': errors / characters if characters else None
+        }
+        results.append(result)
+        rtf_text = f"{result['rtf']:.3f}" if result['rtf'] is not None else "-"
+        cer_text = f"{result['cer'] * 100:.1f}%" if result['cer'] is not None else "-"
+        print(f"语音识别 {mode:>7}: {len(corpus)} 条, 实时率 {rtf_text}, 字错误率 {cer_text}")
+    return results
+
+
+def compare(current, baseline_path):
+    """与之前保存的结果对比，打印主要指标的变化"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def ratio(new, old):
+        return f"{new / old:.2f}x" if old else "-"
+
+    print(f"\n与 {baseline_path} 对比（{baseline['machine']['timestamp']}）:")
+    old_aes = {item['size']: item for item in baseline.get('aes', [])}
+    for item in current.get('aes', []):
+        if item['size'] in old_aes:
+            print(f"  AES {format_size(item['size'])} 加密吞吐: {ratio(item['encrypt_mb_s'], old_aes[item['size']]['encrypt_mb_s'])}")
+    old_e2e = {(item['size'], item['codec']): item for item in baseline.get('end_to_end', [])}
+    for item in current.get('end_to_end', []):
+        old = old_e2e.get((item['size'], item['codec']))
+        if old:
+            print(f"  导出/导入 {format_size(item['size'])} 耗时: "
+                  f"{ratio(item['export_seconds'], old['export_seconds'])} / "
+                  f"{ratio(item['import_seconds'], old['import_seconds'])}")
+    if current.get('extraction') and baseline.get('extraction'):
+        print(f"  文本提取整条正确率: {baseline['extraction']['accuracy']['record'] * 100:.1f}% -> "
+              f"{current['extraction']['accuracy']['record'] * 100:.1f}%")
+    if current.get('extraction', {}).get('engine_per_second') and baseline.get('extraction', {}).get('engine_per_second'):
+        print(f"  提取引擎吞吐: {ratio(current['extraction']['engine_per_second'], baseline['extraction']['engine_per_second'])}")
+    if current.get('bulk_text') and baseline.get('bulk_text'):
+        print(f"  批量文本耗时: {ratio(current['bulk_text']['seconds'], baseline['bulk_text']['seconds'])}")
+    if current.get('classifier') and baseline.get('classifier'):
+        print(f"  分类器预测耗时: {ratio(current['classifier']['predict_us'], baseline['classifier']['predict_us'])}")
+    if current.get('replay') and baseline.get('replay'):
+        print(f"  回放识别吞吐: {ratio(current['replay']['speed'], baseline['replay']['speed'])}")
+    old_voice = {item['mode']: item for item in baseline.get('voice', [])}
+    for item in current.get('voice', []):
+        old = old_voice.get(item['mode'])
+        if old and item['rtf'] and old['rtf']:
+            print(f"  语音识别 {item['mode']} 实时率: {ratio(item['rtf'], old['rtf'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PennAicoin 性能测试")
+    parser.add_argument("--sizes", default="1M,16M,128M", help="测试数据量，逗号分隔，例如 1M,256M,2G")
+    parser.add_argument("--kdf-iterations", default="10000,100000,310000,600000", help="PBKDF2 迭代次数参数组")
+    parser.add_argument("--chunk-size", default="256K", help="AES 测试的分块大小")
+    parser.add_argument("--codec", default="zlib", help="端到端测试使用的压缩方式")
+    parser.add_argument("--level", type=int, default=6, help="端到端测试使用的压缩级别")
+    parser.add_argument("--repeat", type=int, default=3, help="KDF/RSA 测试重复次数，取最短耗时")
+    parser.add_argument("--skip-end-to-end", action="store_true", help="跳过端到端导出/导入测试")
+    parser.add_argument("--voice-corpus", nargs="?", const=VOICE_CORPUS,
+                        help=f"语音测试集JSON（不写路径时使用 {VOICE_CORPUS}），测试提取准确率、回放识别吞吐量，并对比自由识别与受限识别")
+    parser.add_argument("--voice-text-only", action="store_true",
+                        help="只测试文本提取，跳过回放识别和自由/受限识别对比；不加此参数时测试集缺少录音或模型会报错退出")
+    parser.add_argument("--realtime", action="store_true", help="回放录音时按实时速度送入，默认以最快速度回放")
+    parser.add_argument("--voice-model", help="语音识别模型目录，默认使用主程序的模型路径")
+    parser.add_argument("--output", default="bench_crypto.json", help="结果输出的JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    parser.add_argument("--end-to-end-child", nargs=3, metavar=("SIZE", "CODEC", "LEVEL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.end_to_end_child:
+        size, codec, level = args.end_to_end_child
+        print(json.dumps(run_end_to_end(int(size), codec, int(level))))
+        return
+
+    app = load_app()
+    if args.voice_corpus:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        corpus_path = args.voice_corpus
+        if not os.path.isabs(corpus_path) and not os.path.exists(corpus_path):
+            corpus_path = os.path.join(base_dir, corpus_path)
+        model_path = args.voice_model or os.path.join(base_dir, app.VOICE_MODEL_PATH)
+        # 在耗时的加密测试之前检查，缺少录音或模型时尽早报错
+        if not args.voice_text_only:
+            check_voice_inputs(corpus_path, model_path)
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    results = {
+        'machine': machine_info(),
+        'kdf': bench_kdf(app, [int(n) for n in args.kdf_iterations.split(",")], args.repeat),
+        'rsa': bench_rsa(app, args.repeat),
+        'aes': bench_aes(app, sizes, parse_size(args.chunk_size)),
+        'end_to_end': [] if args.skip_end_to_end else bench_end_to_end(sizes, args.codec, args.level)
+    }
+    if args.voice_corpus:
+        results['extraction'] = bench_extraction(app, corpus_path)
+        results['numerals'] = bench_numerals(app)
+        results['bulk_text'] = bench_bulk_text(app, corpus_path)
+        results['classifier'] = bench_category_classifier(app, corpus_path)
+        if args.voice_text_only:
+            print("已按 --voice-text-only 跳过回放识别和自由/受限识别对比")
+        else:
+            results['replay'] = bench_voice_replay(app, corpus_path, model_path, args.realtime)
+            results['voice'] = bench_voice_grammar(app, corpus_path, model_path)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
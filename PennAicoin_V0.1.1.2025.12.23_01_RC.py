@@ -1,30 +1,52 @@
 import os
 import sys
 import time
+import math
+import datetime
+import threading
+import queue
 import sqlite3
 import csv
 import json
+import io
 import base64
 import hashlib
+import hmac
+import struct
+import bisect
+import zlib
+import bz2
+import lzma
 import vosk
 import pyaudio
 import wave
-import jieba
 import re
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from contextlib import contextmanager, nullcontext
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import rsa, padding as asymmetric_padding
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap, InvalidUnwrap
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QComboBox, QDateEdit, QTableWidget, QTableWidgetItem, QMessageBox,
     QDialog, QHeaderView, QTextEdit, QListWidget, 
-    QListWidgetItem, QStackedWidget, QFileDialog, QTabWidget, QInputDialog, QGroupBox, QKeySequenceEdit, QFrame, QScrollArea
+    QListWidgetItem, QStackedWidget, QFileDialog, QTabWidget, QInputDialog, QGroupBox, QKeySequenceEdit, QFrame, QScrollArea,
+    QTableView, QCheckBox
 )
-from PySide6.QtCore import QDate, Qt, QTimer, Signal, QThread, QSize
-from PySide6.QtGui import QIcon, QPixmap, QKeySequence, QFont, QShortcut
+from PySide6.QtCore import QDate, Qt, QTimer, Signal, QThread, QObject, QSize, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QIcon, QPixmap, QKeySequence, QFont, QShortcut, QColor
 
 
 # 资源路径处理函数
@@ -37,69 +59,1419 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def app_data_dir():
+    """应用数据目录（分词词典缓存、用户词典），不随启动时的工作目录变化"""
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    path = os.path.join(base, 'PennAicoin')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+VOICE_MODEL_PATH = "resources/vosk-model-small-cn-0.22"
+
+# 语音记账用到的币种和分类词表，语音提取和受限识别语法共用
+CURRENCY_MAP = {
+    '人民币': '人民币 (CNY)',
+    '美元': '美元 (USD)',
+    '欧元': '欧元 (EUR)',
+    '日元': '日元 (JPY)'
+}
+CATEGORY_MAP = {
+    '工资': '工资收入',
+    '奖金': '奖金收入',
+    '投资': '投资收益',
+    '兼职': '兼职收入',
+    '餐饮': '餐饮',
+    '购物': '购物',
+    '交通': '交通',
+    '住房': '住房',
+    '娱乐': '娱乐',
+    '医疗': '医疗'
+}
+INCOME_CATEGORIES = ["工资收入", "奖金收入", "投资收益", "兼职收入"]
+EXPENSE_CATEGORIES = ["餐饮", "购物", "交通", "住房", "娱乐", "医疗"]
+# 金额和日期口述中会出现的字词
+LEDGER_NUMBER_WORDS = ['零', '一', '二', '两', '三', '四', '五', '六', '七', '八', '九', '十', '百', '千', '万', '点',
+                       '块', '元', '毛', '角', '分', '钱']
+LEDGER_DATE_WORDS = ['年', '月', '日', '号', '今天', '昨天', '前天']
+
+
+def build_ledger_grammar(notes=()):
+    """生成受限识别用的短语表：数字、币种、分类、收支类型、日期以及常用备注词，
+    末尾的 [unk] 让词表外的语音落到未知词上，而不是被强行匹配成表内词"""
+    phrases = LEDGER_NUMBER_WORDS + list(CURRENCY_MAP) + list(CATEGORY_MAP) + ['收入', '支出'] + LEDGER_DATE_WORDS
+    for note in notes:
+        if note and note not in phrases:
+            phrases.append(note)
+    phrases.append('[unk]')
+    return phrases
+
+
+def current_rss():
+    """当前进程常驻内存（字节），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# 语音模型缓存：每个模型在进程内只加载一次并一直保留，每次录音只创建轻量的识别器
+class VoiceModelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        
+    def preload(self, model_path):
+        """在后台线程中加载模型，已加载或正在加载时直接返回"""
+        with self._lock:
+            entry = self._entries.get(model_path)
+            if entry is not None:
+                return entry
+            entry = {
+                'ready': threading.Event(),
+                'model': None,
+                'error': None,
+                'load_seconds': None,
+                'memory_bytes': None
+            }
+            self._entries[model_path] = entry
+            
+        threading.Thread(target=self._load, args=(model_path, entry), daemon=True).start()
+        return entry
+        
+    def _load(self, model_path, entry):
+        try:
+            print(f"正在加载语音识别模型: {model_path}")
+            rss_before = current_rss()
+            start = time.perf_counter()
+            entry['model'] = vosk.Model(model_path)
+            entry['load_seconds'] = time.perf_counter() - start
+            rss_after = current_rss()
+            memory_text = ""
+            if rss_before is not None and rss_after is not None:
+                entry['memory_bytes'] = rss_after - rss_before
+                memory_text = f"，内存增加 {entry['memory_bytes'] / (1 << 20):.1f} MB"
+            print(f"模型加载完成，耗时 {entry['load_seconds']:.2f} 秒{memory_text}")
+        except Exception as e:
+            print(f"加载语音识别模型失败: {e}")
+            entry['error'] = e
+        finally:
+            entry['ready'].set()
+            
+    def is_ready(self, model_path):
+        entry = self._entries.get(model_path)
+        return entry is not None and entry['ready'].is_set() and entry['error'] is None
+        
+    def get_model(self, model_path, timeout=None):
+        """返回已加载的模型，尚未加载完成时等待"""
+        entry = self.preload(model_path)
+        if not entry['ready'].wait(timeout):
+            raise TimeoutError("语音识别模型加载超时")
+        if entry['error'] is not None:
+            # 加载失败的条目不保留，下次调用时重新加载
+            with self._lock:
+                if self._entries.get(model_path) is entry:
+                    del self._entries[model_path]
+            raise entry['error']
+        return entry['model']
+        
+    def create_recognizer(self, model_path, sample_rate=16000, grammar=None):
+        """grammar 为短语列表时创建受限识别器，只在这些词中解码；为None时使用模型的完整词表"""
+        model = self.get_model(model_path)
+        if grammar:
+            return vosk.KaldiRecognizer(model, sample_rate, json.dumps(grammar, ensure_ascii=False))
+        return vosk.KaldiRecognizer(model, sample_rate)
+        
+    def stats(self, model_path):
+        """返回模型的加载耗时（秒）和加载前后的内存增量（字节）"""
+        entry = self._entries.get(model_path) or {}
+        return {
+            'ready': self.is_ready(model_path),
+            'load_seconds': entry.get('load_seconds'),
+            'memory_bytes': entry.get('memory_bytes')
+        }
+
+
+voice_models = VoiceModelRegistry()
+
+
+# 备注切成候选词时的分隔符
+NOTE_TERM_SPLIT = re.compile(r'[\s,，.。;；、:：!！?？()（）/\\|\-]+')
+
+
+def ledger_terms():
+    """记账专用词：币种、分类和收支类型，写入用户词典后分词时不会被切开"""
+    terms = list(CURRENCY_MAP) + list(CATEGORY_MAP) + list(CATEGORY_MAP.values())
+    terms += INCOME_CATEGORIES + EXPENSE_CATEGORIES + ['收入', '支出']
+    return list(dict.fromkeys(terms))
+
+
+def note_terms(note):
+    """备注按空白和标点切成片段，2~8个字且不是纯数字的片段作为用户词典的候选词"""
+    return [t for t in NOTE_TERM_SPLIT.split(str(note)) if 2 <= len(t) <= 8 and not t.isdigit()]
+
+
+# jieba分词：第一次使用时才导入并构建前缀词典（通常由启动预热线程触发），
+# 词典缓存和记账用户词典都放在应用数据目录；新词用 add_word 加入内存词典并追加到用户词典文件，不重建前缀词典
+class LedgerSegmenter:
+    CACHE_NAME = "jieba.cache"
+    USER_DICT_NAME = "ledger_userdict.txt"
+    WORD_FREQ = 20000
+    
+    def __init__(self, data_dir=None):
+        self._lock = threading.Lock()
+        self._jieba = None
+        self.data_dir = data_dir
+        self.words = set()
+        self.term_counts = Counter()
+        
+    @property
+    def loaded(self):
+        return self._jieba is not None
+        
+    @property
+    def user_dict_path(self):
+        return os.path.join(self.data_dir, self.USER_DICT_NAME)
+        
+    def get(self):
+        """返回初始化好的 jieba 模块，多个线程同时调用时只初始化一次"""
+        if self._jieba is None:
+            with self._lock:
+                if self._jieba is None:
+                    self._jieba = self._load()
+        return self._jieba
+        
+    def _load(self):
+        import jieba
+        if self.data_dir is None:
+            self.data_dir = app_data_dir()
+        jieba.dt.tmp_dir = self.data_dir
+        jieba.dt.cache_file = self.CACHE_NAME
+        jieba.initialize()
+        try:
+            with open(self.user_dict_path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if not parts:
+                        continue
+                    freq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else self.WORD_FREQ
+                    jieba.add_word(parts[0], freq)
+                    self.words.add(parts[0])
+        except FileNotFoundError:
+            pass
+        # 首次运行或词表新增了分类时补写用户词典
+        self._add_words(jieba, ledger_terms())
+        return jieba
+        
+    def _add_words(self, jieba, words):
+        new = [w for w in dict.fromkeys(words) if w and w not in self.words]
+        if not new:
+            return new
+        for word in new:
+            jieba.add_word(word, self.WORD_FREQ)
+            self.words.add(word)
+        try:
+            with open(self.user_dict_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{word} {self.WORD_FREQ}\n" for word in new)
+        except OSError as e:
+            print(f"写入用户词典失败: {e}")
+        return new
+        
+    def add_words(self, words):
+        """把新词加入分词词典和用户词典文件，返回真正新增的词"""
+        jieba = self.get()
+        with self._lock:
+            return self._add_words(jieba, words)
+            
+    def learn(self, note_counts, min_count=2):
+        """统计备注片段的出现次数，达到 min_count 且默认词典会把它切开的片段作为新词加入"""
+        jieba = self.get()
+        candidates = []
+        for note, count in note_counts:
+            for term in note_terms(note):
+                self.term_counts[term] += count
+                if (self.term_counts[term] >= min_count and term not in self.words
+                        and len(jieba.lcut(term)) > 1):
+                    candidates.append(term)
+        return self.add_words(candidates) if candidates else []
+        
+    def lcut(self, text):
+        return self.get().lcut(text)
+
+
+ledger_segmenter = LedgerSegmenter()
+
+
+# 语音记账各阶段耗时统计：按录音会话汇总写入结构化日志（每行一个JSON），
+# 同时保留每个阶段最近的样本用于计算 p50/p95
+VOICE_TIMINGS_LOG = "voice_timings.jsonl"
+
+
+class VoiceTimings:
+    WINDOW = 200
+    
+    def __init__(self, log_path=VOICE_TIMINGS_LOG):
+        self._lock = threading.Lock()
+        self.log_path = log_path
+        self.samples = {}
+        self.last = {}
+        self.session = None
+        self.session_count = 0
+        
+    def start_session(self):
+        """开始新的录音会话，上一个会话的统计写入日志"""
+        with self._lock:
+            self._flush()
+            self.session_count += 1
+            self.session = {
+                'session': self.session_count,
+                'started': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                'origin': time.perf_counter(),
+                'events': {},
+                'stages': {}
+            }
+            
+    def finish_session(self):
+        with self._lock:
+            self._flush()
+            
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, deque(maxlen=self.WINDOW)).append(seconds)
+            self.last[stage] = seconds
+            if self.session is not None:
+                entry = self.session['stages'].setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+                entry['count'] += 1
+                entry['total'] += seconds
+                entry['max'] = max(entry['max'], seconds)
+                
+    def mark(self, event):
+        """记录会话开始到某个事件（如第一帧音频）经过的时间"""
+        with self._lock:
+            if self.session is None or event in self.session['events']:
+                return
+            seconds = self.session['events'][event] = time.perf_counter() - self.session['origin']
+        self.record(event, seconds)
+        
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+            
+    def percentiles(self, stage):
+        with self._lock:
+            values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return None, None
+        return values[int(0.5 * (len(values) - 1))], values[int(round(0.95 * (len(values) - 1)))]
+        
+    def summary(self):
+        """每个阶段最近一次耗时、p50、p95 和样本数（秒）"""
+        result = {}
+        for stage in list(self.samples):
+            p50, p95 = self.percentiles(stage)
+            result[stage] = {'last': self.last.get(stage), 'p50': p50, 'p95': p95, 'count': len(self.samples[stage])}
+        return result
+        
+    def _flush(self):
+        session, self.session = self.session, None
+        if session is None or not self.log_path:
+            return
+        session.pop('origin')
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(session, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入语音耗时日志失败: {e}")
+
+
+voice_timings = VoiceTimings()
+
+
+# PyAudio 在进程内共用一个实例，初始化（枚举音频设备）只做一次
+_pyaudio_lock = threading.Lock()
+_pyaudio_instance = None
+
+
+def shared_pyaudio():
+    global _pyaudio_instance
+    with _pyaudio_lock:
+        if _pyaudio_instance is None:
+            _pyaudio_instance = pyaudio.PyAudio()
+        return _pyaudio_instance
+
+
+# 启动预热：主窗口显示后在后台线程中准备语音模型、音频设备和jieba分词词典
+class EngineWarmup(QObject):
+    status_changed = Signal()
+    
+    ENGINES = (("model", "模型"), ("audio", "音频"), ("jieba", "分词"))
+    
+    def __init__(self, model_path, db_path=None, parent=None):
+        super().__init__(parent)
+        self.model_path = model_path
+        self.db_path = db_path
+        self.learned_terms = []
+        self.ready = {name: False for name, _ in self.ENGINES}
+        self.errors = {}
+        self.started = False
+        
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        for name, target in (
+            ("model", lambda: voice_models.get_model(self.model_path)),
+            ("audio", shared_pyaudio),
+            ("jieba", self.load_segmenter),
+        ):
+            threading.Thread(target=self._run, args=(name, target), daemon=True).start()
+            
+    def load_segmenter(self):
+        """加载分词词典后扫描一遍账本备注学习新词。扫描和 add_word 都在预热线程中完成，
+        使用独立的数据库连接；完成前分词已经可用，只是还没有账本里的新词"""
+        ledger_segmenter.get()
+        if self.db_path is None:
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            note_counts = conn.execute("SELECT note, COUNT(*) FROM records WHERE note != '' GROUP BY note").fetchall()
+        finally:
+            conn.close()
+        self.learned_terms = ledger_segmenter.learn(note_counts)
+            
+    def _run(self, name, target):
+        try:
+            target()
+            self.ready[name] = True
+        except Exception as e:
+            print(f"预热 {name} 失败: {e}")
+            self.errors[name] = str(e)
+        # 跨线程发射信号，槽函数会在主线程中执行
+        self.status_changed.emit()
+        
+    def is_ready(self):
+        return all(self.ready.values())
+        
+    def status_text(self):
+        parts = []
+        for name, label in self.ENGINES:
+            if self.ready[name]:
+                parts.append(f"{label}✓")
+            elif name in self.errors:
+                parts.append(f"{label}✗")
+            else:
+                parts.append(f"{label}…")
+        return "语音引擎: " + "  ".join(parts)
+
+
+# 定长环形音频缓冲区：预先分配内存，只保留最近 N 秒的音频，内存占用与录音时长无关
+class AudioRingBuffer:
+    def __init__(self, seconds, sample_rate=16000, sample_width=2):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.capacity = int(seconds * sample_rate) * sample_width
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.write_pos = 0
+        self.size = 0
+        self.total_bytes = 0
+        
+    def write(self, data):
+        length = len(data)
+        self.total_bytes += length
+        if length >= self.capacity:
+            self.view[:] = data[-self.capacity:]
+            self.write_pos = 0
+            self.size = self.capacity
+            return
+        end = self.write_pos + length
+        if end <= self.capacity:
+            self.view[self.write_pos:end] = data
+        else:
+            first = self.capacity - self.write_pos
+            self.view[self.write_pos:] = data[:first]
+            self.view[:length - first] = data[first:]
+        self.write_pos = end % self.capacity
+        self.size = min(self.capacity, self.size + length)
+        
+    def read_last(self, length=None):
+        """按时间顺序返回最近 length 字节（默认全部）的音频"""
+        length = self.size if length is None else min(length, self.size)
+        start = (self.write_pos - length) % self.capacity
+        if start + length <= self.capacity:
+            return bytes(self.view[start:start + length])
+        return bytes(self.view[start:]) + bytes(self.view[:length - (self.capacity - start)])
+        
+    def clear(self):
+        self.write_pos = 0
+        self.size = 0
+        self.total_bytes = 0
+        
+    def seconds(self):
+        return self.size / (self.sample_rate * self.sample_width)
+
+
+# 基于能量的语音端点检测：静音帧不送识别器，停顿超过 end_silence 秒切分为一句，
+# 说话结束后静音超过 stop_silence 秒自动停止录音
+class SpeechEndpointer:
+    def __init__(self, sample_rate=16000, chunk_frames=1024, threshold=None, end_silence=0.5,
+                 stop_silence=1.5, preroll=0.3, noise_ratio=3.0, min_threshold=300):
+        self.bytes_per_second = sample_rate * 2
+        self.threshold = threshold  # 为None时根据环境噪声自适应
+        self.end_silence = end_silence
+        self.stop_silence = stop_silence
+        self.noise_ratio = noise_ratio
+        self.min_threshold = min_threshold
+        # 保留语音开始前的几帧静音一起送入识别器，避免切掉第一个字的起音
+        self.preroll_chunks = deque(maxlen=max(1, int(preroll * sample_rate / chunk_frames)))
+        self.noise_floor = None
+        self.in_utterance = False
+        self.heard_speech = False
+        self.silence = 0.0
+        self.voiced_chunks = 0
+        self.skipped_chunks = 0
+        
+    @staticmethod
+    def rms(data):
+        samples = array('h', data)
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        if not samples:
+            return 0.0
+        return (sum(sample * sample for sample in samples) / len(samples)) ** 0.5
+        
+    def current_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        if self.noise_floor is None:
+            return self.min_threshold
+        return max(self.min_threshold, self.noise_floor * self.noise_ratio)
+        
+    def process(self, data):
+        """返回 (需要送入识别器的音频块列表, 是否一句话结束)"""
+        level = self.rms(data)
+        if level >= self.current_threshold():
+            chunks = [] if self.in_utterance else list(self.preroll_chunks)
+            chunks.append(data)
+            self.preroll_chunks.clear()
+            self.in_utterance = True
+            self.heard_speech = True
+            self.silence = 0.0
+            self.voiced_chunks += 1
+            return chunks, False
+            
+        self.silence += len(data) / self.bytes_per_second
+        if self.in_utterance:
+            # 句中的短停顿照常送入识别器，避免截断词尾
+            if self.silence >= self.end_silence:
+                self.in_utterance = False
+                return [data], True
+            return [data], False
+            
+        # 只在静音段更新噪声基线
+        self.noise_floor = level if self.noise_floor is None else self.noise_floor * 0.9 + level * 0.1
+        self.preroll_chunks.append(data)
+        self.skipped_chunks += 1
+        return [], False
+        
+    def should_stop(self):
+        return self.heard_speech and not self.in_utterance and self.silence >= self.stop_silence
+
+
+# 中文数字解析：逐字查表，支持 十/百/千/万/亿、零、点，数字逐个读出的写法（二零二五），
+# 以及口语中省略末位单位的说法（两千五 = 2500，一万二 = 12000）
+CHINESE_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+CHINESE_DIGITS.update({str(digit): digit for digit in range(10)})
+CHINESE_UNITS = {'十': 10, '百': 100, '千': 1000}
+CHINESE_BIG_UNITS = {'万': 10 ** 4, '亿': 10 ** 8}
+
+
+def parse_chinese_number(text):
+    """把中文数字或阿拉伯数字（可以夹杂空格）转换为数值，无法解析时返回None"""
+    text = text.replace(' ', '')
+    integer_text, _, decimal_text = text.replace('.', '点').partition('点')
+    total = section = 0
+    number = None
+    last_unit = None
+    previous_is_digit = False
+    for char in integer_text:
+        if char in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[char]
+            number = number * 10 + digit if previous_is_digit and number is not None else digit
+            previous_is_digit = True
+        elif char in CHINESE_UNITS:
+            unit = CHINESE_UNITS[char]
+            section += (1 if number is None else number) * unit
+            number = None
+            last_unit = unit
+            previous_is_digit = False
+        elif char in CHINESE_BIG_UNITS:
+            unit = CHINESE_BIG_UNITS[char]
+            total += (section + (number or 0)) * unit
+            section = 0
+            number = None
+            last_unit = unit
+            previous_is_digit = False
+        else:
+            return None
+    if number is not None:
+        if last_unit is not None and last_unit >= 100 and number < 10 and integer_text[-2] in CHINESE_UNITS.keys() | CHINESE_BIG_UNITS.keys():
+            # 口语省略末位单位：两千五、三百六、一万二
+            number *= last_unit // 10
+        section += number
+    value = total + section
+    if decimal_text:
+        digits = [CHINESE_DIGITS.get(char) for char in decimal_text]
+        if None in digits:
+            return None
+        value += float('0.' + ''.join(map(str, digits)))
+    elif not integer_text:
+        return None
+    return value
+
+
+# Aho-Corasick 多关键词自动机：只保存关键词前缀树的转移和失败跳转，内存与关键词总长度成正比；
+# 扫描时匹配失败沿失败跳转回退，每个字符的平均回退次数为常数，一遍找出文本中所有关键词
+class KeywordAutomaton:
+    def __init__(self, keywords):
+        """keywords 为 {关键词: 值}"""
+        goto = [{}]
+        outputs = [None]
+        for keyword, value in keywords.items():
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                child = goto[state].get(char)
+                if child is None:
+                    child = goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append(None)
+                state = child
+            outputs[state] = (keyword, value)
+            
+        # 按广度优先计算失败跳转；output_link 指向失败链上最近的关键词结尾状态，0 表示没有
+        fail = [0] * len(goto)
+        output_link = [0] * len(goto)
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in goto[state].items():
+                target = fail[state]
+                while target and char not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(char, 0) if state else 0
+                output_link[child] = fail[child] if outputs[fail[child]] else output_link[fail[child]]
+                pending.append(child)
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+        self.output_link = output_link
+        
+    def finditer(self, text):
+        """按结束位置顺序返回 (开始位置, 关键词, 值)，同一位置结束的长词在前"""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        output_link = self.output_link
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if outputs[state] else output_link[state]
+            while match:
+                keyword, value = outputs[match]
+                yield index + 1 - len(keyword), keyword, value
+                match = output_link[match]
+
+
+# 记账规则：文本中出现关键词时填入分类、收支类型和币种，空字段不设置；多条规则设置同一字段时优先级高的生效，
+# 优先级相同时取文本中先出现的
+LedgerRule = namedtuple('LedgerRule', 'keyword category type currency priority')
+
+
+# 记账规则表：保存在账本数据库中，首次建表时用内置的币种、分类词表填充。
+# 语音、粘贴文本和批量转写都通过同一个 LedgerExtractor 使用这些规则，修改后调用 set_rules 重新编译即可生效
+class LedgerRules:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keyword TEXT NOT NULL UNIQUE,
+            category TEXT,
+            type TEXT,
+            currency TEXT,
+            priority INTEGER NOT NULL DEFAULT 0
+        )
+    '''
+    TYPES = ('收入', '支出')
+    
+    def __init__(self, conn):
+        self.conn = conn
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='rules'").fetchone()
+        with conn:
+            conn.execute(self.SCHEMA)
+            if not exists:
+                self._insert(self.default_rules())
+        self.load()
+        
+    @staticmethod
+    def default_rules():
+        rules = [LedgerRule(word, None, None, currency, 0) for word, currency in CURRENCY_MAP.items()]
+        # 同时出现“收入”和“支出”时以“收入”为准
+        rules.append(LedgerRule('收入', None, '收入', None, 1))
+        rules.append(LedgerRule('支出', None, '支出', None, 0))
+        rules += [LedgerRule(word, category, None, None, 0) for word, category in CATEGORY_MAP.items()]
+        return rules
+        
+    def _insert(self, rules):
+        self.conn.executemany(
+            "INSERT INTO rules (keyword, category, type, currency, priority) VALUES (?,?,?,?,?)",
+            [tuple(rule) for rule in rules]
+        )
+        
+    def load(self):
+        self.rules = [LedgerRule(*row) for row in self.conn.execute(
+            "SELECT keyword, category, type, currency, priority FROM rules ORDER BY id")]
+        return self.rules
+        
+    def save(self, rules):
+        """整体替换规则表，出错时回滚并抛出 sqlite3.Error"""
+        with self.conn:
+            self.conn.execute("DELETE FROM rules")
+            self._insert(rules)
+        return self.load()
+        
+    def keywords(self):
+        return [rule.keyword for rule in self.rules]
+        
+    def categories(self, type_=None):
+        """规则中出现的分类，type_ 为“收入”时只返回同时设为收入的分类"""
+        return list(dict.fromkeys(rule.category for rule in self.rules
+                                  if rule.category and (type_ is None or rule.type == type_)))
+        
+    def currencies(self):
+        return list(dict.fromkeys(rule.currency for rule in self.rules if rule.currency))
+
+
+# 分类器：按备注分词做多项式朴素贝叶斯，词频和各分类的计数保存在账本数据库中，启动时直接读入内存。
+# records 表上的触发器把每次增删改的 (备注, 分类, ±1) 写入待学习队列，不论从哪里修改账本都不会漏掉；
+# 分词可用后由 sync 一次读完队列更新模型。首次建表时把已有记录全部放入队列，第一次 sync 就是一遍流式训练
+class CategoryClassifier:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS category_model_tokens (
+            token TEXT,
+            category TEXT,
+            count INTEGER,
+            PRIMARY KEY (token, category)
+        );
+        CREATE TABLE IF NOT EXISTS category_model_classes (
+            category TEXT PRIMARY KEY,
+            docs INTEGER,
+            tokens INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS category_model_pending (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            note TEXT,
+            category TEXT,
+            delta INTEGER
+        );
+        CREATE TRIGGER IF NOT EXISTS category_model_insert AFTER INSERT ON records BEGIN
+            INSERT INTO category_model_pending (note, category, delta) VALUES (NEW.note, NEW.category, 1);
+        END;
+        CREATE TRIGGER IF NOT EXISTS category_model_update AFTER UPDATE OF note, category ON records BEGIN
+            INSERT INTO category_model_pending (note, category, delta) VALUES (OLD.note, OLD.category, -1);
+            INSERT INTO category_model_pending (note, category, delta) VALUES (NEW.note, NEW.category, 1);
+        END;
+        CREATE TRIGGER IF NOT EXISTS category_model_delete AFTER DELETE ON records BEGIN
+            INSERT INTO category_model_pending (note, category, delta) VALUES (OLD.note, OLD.category, -1);
+        END;
+    '''
+    QUEUE_ALL_SQL = "INSERT INTO category_model_pending (note, category, delta) SELECT note, category, 1 FROM records"
+    # 不参与训练的分类（默认分类不含信息）和不作为特征的词（数字、金额单位、标点）
+    IGNORED_CATEGORIES = ('', '其他')
+    NOT_FEATURE = re.compile(r'[\d.零〇一二两三四五六七八九十百千万亿点块元毛角分钱\W_]+')
+    MIN_PROBABILITY = 0.5
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.token_counts = {}
+        self.class_docs = {}
+        self.class_tokens = {}
+        self._log_prior = None
+        self._log_denominator = None
+        self.ensure_schema()
+        self.load()
+        
+    def ensure_schema(self):
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='category_model_pending'").fetchone()
+        self.conn.executescript(self.SCHEMA)
+        if not exists:
+            with self.conn:
+                self.conn.execute(self.QUEUE_ALL_SQL)
+                
+    def load(self):
+        """从数据库读入模型"""
+        self.set_model(self.read_model(self.conn))
+        
+    @staticmethod
+    def read_model(conn):
+        """读出 (token_counts, class_docs, class_tokens)，可以在后台线程中用独立的连接调用"""
+        token_counts = {}
+        for token, category, count in conn.execute("SELECT token, category, count FROM category_model_tokens"):
+            token_counts.setdefault(token, {})[category] = count
+        class_docs = {}
+        class_tokens = {}
+        for category, docs, tokens in conn.execute("SELECT category, docs, tokens FROM category_model_classes"):
+            class_docs[category] = docs
+            class_tokens[category] = tokens
+        return token_counts, class_docs, class_tokens
+        
+    def set_model(self, model):
+        """整体换上 read_model 读出的模型，预测时不会看到训练到一半的状态"""
+        self.token_counts, self.class_docs, self.class_tokens = model
+        self._log_prior = None
+        
+    @classmethod
+    def features(cls, words):
+        return [word for word in (w.strip() for w in words) if word and not cls.NOT_FEATURE.fullmatch(word)]
+        
+    def pending_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM category_model_pending").fetchone()[0]
+        
+    @classmethod
+    def rebuild(cls, conn):
+        """清空模型，把全部记录重新放入队列，下次训练时从头学习"""
+        with conn:
+            conn.execute("DELETE FROM category_model_tokens")
+            conn.execute("DELETE FROM category_model_classes")
+            conn.execute("DELETE FROM category_model_pending")
+            conn.execute(cls.QUEUE_ALL_SQL)
+            
+    def sync(self, tokenize):
+        """在当前连接上训练并重新读入模型，返回处理的条数；界面中由 CategoryModelSync 在后台线程训练"""
+        pending = self.train(self.conn, tokenize)
+        if pending:
+            self.load()
+        return pending
+        
+    @classmethod
+    def train(cls, conn, tokenize):
+        """读完待学习队列并更新数据库中的模型，返回处理的条数；tokenize 为分词函数。
+        只读写数据库、不改动内存中的模型，可以在后台线程中用独立的连接调用"""
+        pending = conn.execute("SELECT COUNT(*) FROM category_model_pending").fetchone()[0]
+        if not pending:
+            return 0
+        # 恢复备份等整表替换时，队列比账本本身还长，直接重新训练更快
+        records = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if pending > records:
+            cls.rebuild(conn)
+            
+        token_deltas = Counter()
+        doc_deltas = Counter()
+        length_deltas = Counter()
+        last_seq = 0
+        # 先读出整个队列再分词，分词期间不持有数据库的读锁，界面线程的写入不会被挡住
+        rows = conn.execute("SELECT seq, note, category, delta FROM category_model_pending ORDER BY seq").fetchall()
+        for seq, note, category, delta in rows:
+            last_seq = seq
+            if not note or category is None or category in cls.IGNORED_CATEGORIES:
+                continue
+            tokens = cls.features(tokenize(str(note)))
+            if not tokens:
+                continue
+            doc_deltas[category] += delta
+            length_deltas[category] += delta * len(tokens)
+            for token in tokens:
+                token_deltas[token, category] += delta
+                
+        with conn:
+            conn.executemany(
+                "INSERT INTO category_model_tokens (token, category, count) VALUES (?,?,?) "
+                "ON CONFLICT (token, category) DO UPDATE SET count = count + excluded.count",
+                [(token, category, delta) for (token, category), delta in token_deltas.items() if delta]
+            )
+            conn.executemany(
+                "INSERT INTO category_model_classes (category, docs, tokens) VALUES (?,?,?) "
+                "ON CONFLICT (category) DO UPDATE SET docs = docs + excluded.docs, tokens = tokens + excluded.tokens",
+                [(category, doc_deltas[category], length_deltas[category]) for category in doc_deltas]
+            )
+            conn.execute("DELETE FROM category_model_tokens WHERE count <= 0")
+            conn.execute("DELETE FROM category_model_classes WHERE docs <= 0")
+            conn.execute("DELETE FROM category_model_pending WHERE seq <= ?", (last_seq,))
+        return pending
+        
+    def _prepare(self):
+        # 先验和拉普拉斯平滑的分母只在模型变化后重新计算
+        total_docs = sum(self.class_docs.values())
+        vocabulary = len(self.token_counts)
+        self._log_prior = {c: math.log(docs / total_docs) for c, docs in self.class_docs.items()}
+        self._log_denominator = {c: math.log(self.class_tokens[c] + vocabulary) for c in self.class_docs}
+        
+    def predict(self, words):
+        """返回 (分类, 后验概率)；备注里没有学过的词或把握不足时返回None"""
+        tokens = [token for token in words if token in self.token_counts]
+        if not tokens or len(self.class_docs) < 2:
+            return None
+        if self._log_prior is None:
+            self._prepare()
+        n = len(tokens)
+        denominator = self._log_denominator
+        scores = {c: prior - n * denominator[c] for c, prior in self._log_prior.items()}
+        for token in tokens:
+            for category, count in self.token_counts[token].items():
+                scores[category] += math.log1p(count)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        probability = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        if probability < self.MIN_PROBABILITY:
+            return None
+        return best, probability
+
+
+# 分类模型的后台训练：在线程中用独立的数据库连接分词、训练并读出新模型，完成后在界面线程中整体换上；
+# 训练期间账本又有改动时，结束后再训练一次
+class CategoryModelSync(QObject):
+    trained = Signal(object)
+    
+    def __init__(self, classifier, db_path, parent=None):
+        super().__init__(parent)
+        self.classifier = classifier
+        self.db_path = db_path
+        self.tokenize = None
+        self.running = False
+        self.requested = False
+        self.trained.connect(self._apply)
+        
+    def request(self, tokenize):
+        self.tokenize = tokenize
+        if self.running:
+            self.requested = True
+            return
+        self.running = True
+        self.requested = False
+        threading.Thread(target=self._run, args=(tokenize,), daemon=True).start()
+        
+    def _run(self, tokenize):
+        model = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                if CategoryClassifier.train(conn, tokenize):
+                    model = CategoryClassifier.read_model(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"更新分类模型时出错: {e}")
+        # 跨线程发射信号，_apply 在主线程中执行
+        self.trained.emit(model)
+        
+    def _apply(self, model):
+        self.running = False
+        if model is not None:
+            self.classifier.set_model(model)
+        if self.requested:
+            self.request(self.tokenize)
+
+
+# 提取结果：记录字段加上每个字段的置信度（1.0 为文本中明确说出，较低的值为推断或默认值）
+class ExtractedRecord(namedtuple('ExtractedRecord', 'date amount currency type category note confidence')):
+    __slots__ = ()
+    
+    def values(self):
+        """写入数据库的 (日期, 金额, 币种, 类型, 分类, 备注)"""
+        return self[:6]
+
+
+# 记账信息提取：从识别文本中提取日期、金额、币种、收支类型、分类和备注，
+# 不依赖界面，录音、批量转写和回放测试共用。关键词自动机和正则在构建时编译一次，
+# 提取时对文本只扫描一遍
+class LedgerExtractor:
+    # 数字（中文或阿拉伯数字，识别结果中字之间可能有空格）。
+    # 点后面是逐个读出的数字才是小数点（三点五）；七点、七点三十 是时刻，点不属于数字。
+    # 数字后面只会跟年/月/号/块等非数字字符，少取几个字不可能让匹配成功，所以用原子组禁止回溯
+    DECIMAL = r'[点.]\s*[零〇一二两三四五六七八九\d](?:\s*[零〇一二两三四五六七八九\d])*(?!\s*[零〇一二两三四五六七八九十百千万亿\d])'
+    NUMERAL = rf'(?>[零〇一二两三四五六七八九十百千万亿\d](?:\s*[零〇一二两三四五六七八九十百千万亿\d])*(?:\s*{DECIMAL})?)'
+    DIGIT = r'[零一二两三四五六七八九\d]'
+    # 时刻的小时和分钟；分钟后面是金额单位时属于金额（七点 二十块）
+    CLOCK_HOUR = r'(?>(?:[零一二两三四五六七八九十\d]\s*){1,3})'
+    CLOCK_MINUTE = r'(?:[零一二两三四五六七八九十\d]\s*){1,3}(?!\s*(?:[零一二两三四五六七八九十\d毛角钱]|{units}))'
+    # 日、号作为日期结尾（排除“日元”“五号线”）
+    DAY_SUFFIX = r'(?:号(?!\s*线)|日(?!\s*元))'
+    # 日期和金额合在一个正则中，一次扫描；同一位置先尝试日期。
+    # 粘贴的文本和聊天记录里常见 2025-03-05 这样的日期和 12:30 这样的时刻，时刻既不是日期也不是金额；
+    # 口述的时刻（七点、七点半、七点三十分）同样跳过，分钟数不会被当作金额
+    # 金额单位除块/元外还包括币种名称（四百五十美元），在构建时按币种表生成
+    NUMBER_TEMPLATE = (
+        r'(?P<isoyear>\d{4})\s*[-/.]\s*(?P<isomonth>\d{1,2})\s*[-/.]\s*(?P<isoday>\d{1,2})(?!\d)'
+        r'|(?P<clock>\d{1,2}\s*[:：]\s*\d{2}(?:\s*[:：]\s*\d{2})?'
+        rf'|{CLOCK_HOUR}(?!{DECIMAL})点\s*(?:钟|半|[一三]\s*刻|{CLOCK_MINUTE}分?)?)'
+        # 数字开头的日期都以年/月/天/号/日结尾，先用前瞻排除，金额不必把每种日期写法都试一遍
+        rf'|(?={NUMERAL}\s*[年月天号日])(?:'
+        rf'(?:(?P<year>{NUMERAL})\s*年\s*)?(?P<month>{NUMERAL})\s*月\s*(?P<day>{NUMERAL})\s*{DAY_SUFFIX}'
+        rf'|(?P<ago>{NUMERAL})\s*天\s*以?前'
+        rf'|(?P<dayonly>{NUMERAL})\s*{DAY_SUFFIX})'
+        r'|(?P<relday>大前天|前天|昨天|昨日|今天|今日|明天)'
+        r'|(?P<weekrel>上上|上|这|本)?\s*个?\s*(?:周|星期|礼拜)\s*(?P<weekday>[一二三四五六日天1-7])'
+        rf'|(?P<monthrel>上个?月|这个?月|本月)\s*(?P<monthday>{NUMERAL})\s*{DAY_SUFFIX}'
+        # 块后面的单个数字是毛（块五），元和币种后面要说出毛/角（六十元 一本 不是 60.1）
+        rf'|(?P<amount>{NUMERAL})(?:\s*(?P<yuan>(?P<kuai>块)|{{units}})\s*钱?'
+        rf'(?:\s*(?P<jiao>{DIGIT})\s*(?P<jiaounit>[毛角])?(?(jiaounit)|(?(kuai)|(?!))))?'
+        rf'(?:\s*(?P<fen>{DIGIT})\s*(?(jiaounit)分?|分))?'
+        rf'|\s*(?P<mao>[毛角])\s*钱?(?:\s*(?P<maofen>{DIGIT})\s*分?)?|\s*(?P<fenonly>分)(?!\s*[钟之]))?'
+    )
+    RELATIVE_DAYS = {'大前天': -3, '前天': -2, '昨天': -1, '昨日': -1, '今天': 0, '今日': 0, '明天': 1}
+    WEEK_OFFSETS = {None: 0, '这': 0, '本': 0, '上': -1, '上上': -2}
+    WEEKDAYS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6,
+                '1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6': 5, '7': 6}
+    # 数字后面跟着这些字时不是金额（三月、五号线、两天、三个），时长单位同样排除（三十分钟、两小时）；
+    # 单独的“分”是金额单位，只有“分钟”“分之”才排除
+    NOT_AMOUNT_SUFFIX = re.compile(r'\s*(?:[年月日号天周个点岁次层楼线秒]|分\s*[钟之]|小\s*时)')
+    DEFAULT_CURRENCY = '人民币 (CNY)'
+    DEFAULT_CATEGORY = '其他'
+    
+    def __init__(self, rules=None, income_categories=INCOME_CATEGORIES, classifier=None):
+        # 没有说出分类关键词时用分类器按备注推断分类
+        self.classifier = classifier
+        self.base_income_categories = list(income_categories)
+        self.set_rules(LedgerRules.default_rules() if rules is None else rules)
+        self._today = None
+        self._today_date = None
+        self._today_expires = 0.0
+        
+    def set_rules(self, rules):
+        """按规则重新编译关键词自动机和金额正则，查找耗时与文本长度成正比，自动机内存与关键词总长度成正比"""
+        keywords = {}
+        for rule in rules:
+            assignments = tuple((field, getattr(rule, field)) for field in ('category', 'type', 'currency')
+                                if getattr(rule, field))
+            if rule.keyword and assignments:
+                keywords[rule.keyword] = (rule.priority or 0, assignments)
+        # 币种关键词同时作为金额单位（四百五十美元）
+        units = sorted(['块', '元'] + [rule.keyword for rule in rules if rule.keyword and rule.currency],
+                       key=len, reverse=True)
+        # 开头的前瞻先按首字快速排除不可能是日期或金额的位置
+        number_pattern = re.compile(
+            r'(?=[零〇一二两三四五六七八九十百千万亿\d大前昨今明上这本周星礼])(?:'
+            + self.NUMBER_TEMPLATE.replace('{units}', '|'.join(map(re.escape, units))) + ')'
+        )
+        income_categories = set(self.base_income_categories)
+        income_categories.update(rule.category for rule in rules if rule.category and rule.type == '收入')
+        # 编译完成后再一起替换，提取过程中不会看到新旧混合的状态
+        self.automaton, self.number_pattern, self.income_categories = (
+            KeywordAutomaton(keywords), number_pattern, income_categories)
+        
+    def today(self):
+        """当天日期字符串，缓存到午夜，避免每次提取都格式化日期"""
+        now = time.time()
+        if now >= self._today_expires:
+            local = time.localtime(now)
+            self._today = time.strftime("%Y-%m-%d", local)
+            self._today_date = datetime.date(local.tm_year, local.tm_mon, local.tm_mday)
+            self._today_expires = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        return self._today
+        
+    def parse_date(self, match):
+        """把日期表达式换算为日期；没说年份或月份时取不晚于今天的最近日期，无效日期返回None"""
+        self.today()
+        today = self._today_date
+        try:
+            if match.group('isoyear'):
+                return datetime.date(int(match.group('isoyear')), int(match.group('isomonth')), int(match.group('isoday')))
+            if match.group('month'):
+                month = parse_chinese_number(match.group('month'))
+                day = parse_chinese_number(match.group('day'))
+                if match.group('year'):
+                    year = parse_chinese_number(match.group('year'))
+                    year = year + 2000 if year < 100 else year
+                    return datetime.date(int(year), int(month), int(day))
+                result = datetime.date(today.year, int(month), int(day))
+                return result if result <= today else result.replace(year=today.year - 1)
+            if match.group('relday'):
+                return today + datetime.timedelta(days=self.RELATIVE_DAYS[match.group('relday')])
+            if match.group('ago'):
+                return today - datetime.timedelta(days=int(parse_chinese_number(match.group('ago'))))
+            if match.group('weekday'):
+                monday = today - datetime.timedelta(days=today.weekday())
+                weeks = self.WEEK_OFFSETS[match.group('weekrel')]
+                result = monday + datetime.timedelta(weeks=weeks, days=self.WEEKDAYS[match.group('weekday')])
+                if match.group('weekrel') is None and result > today:
+                    # 只说“周五”且本周五还没到，指的是上周五
+                    result -= datetime.timedelta(weeks=1)
+                return result
+            if match.group('monthrel'):
+                day = int(parse_chinese_number(match.group('monthday')))
+                if match.group('monthrel').startswith('上'):
+                    last_month_end = today.replace(day=1) - datetime.timedelta(days=1)
+                    return last_month_end.replace(day=day)
+                return today.replace(day=day)
+            day = int(parse_chinese_number(match.group('dayonly')))
+            if day <= today.day:
+                return today.replace(day=day)
+            # 本月还没到这一天时取最近一个有这一天的月份（三月初说“三十一号”指一月三十一日）
+            month_start = today.replace(day=1)
+            for _ in range(12):
+                month_start = (month_start - datetime.timedelta(days=1)).replace(day=1)
+                try:
+                    return month_start.replace(day=day)
+                except ValueError:
+                    continue
+            return None
+        except (TypeError, ValueError, OverflowError):
+            return None
+            
+    def parse_amount(self, match, text):
+        """返回 (金额, 是否带货币单位)，不是金额时返回None"""
+        # 一次取出所有分组，逐个按名字取分组在提取时占了不少时间
+        amount, yuan, jiao, fen, mao, maofen, fenonly = match.group(
+            'amount', 'yuan', 'jiao', 'fen', 'mao', 'maofen', 'fenonly')
+        has_unit = bool(yuan or mao or fenonly)
+        if not has_unit and self.NOT_AMOUNT_SUFFIX.match(text, match.end()):
+            return None
+        value = parse_chinese_number(amount)
+        if value is None:
+            return None
+        if mao:
+            value = value / 10 + CHINESE_DIGITS.get(maofen, 0) / 100
+        elif fenonly:
+            value = value / 100
+        elif yuan:
+            # 块五 = 5毛，块五毛二 = 5毛2分
+            value += CHINESE_DIGITS.get(jiao, 0) / 10 + CHINESE_DIGITS.get(fen, 0) / 100
+        return round(float(value), 2), has_unit
+        
+    def extract(self, text, words=None):
+        """返回 ExtractedRecord；words 为已经分好的词，用于生成备注，为None时在这里分词"""
+        found = {}
+        priorities = {}
+        for start, keyword, (priority, assignments) in self.automaton.finditer(text):
+            for field, value in assignments:
+                if field not in found or priority > priorities[field]:
+                    found[field] = value
+                    priorities[field] = priority
+                
+        date = amount = bare_amount = None
+        for match in self.number_pattern.finditer(text):
+            if match.group('amount') is None:
+                if date is None and match.group('clock') is None:
+                    date = self.parse_date(match)
+                continue
+            if amount is not None:
+                continue
+            parsed = self.parse_amount(match, text)
+            if parsed is None:
+                continue
+            # 带“块/元/毛”的数字优先作为金额，否则取第一个单独的数字
+            if parsed[1]:
+                amount = parsed[0]
+            elif bare_amount is None:
+                bare_amount = parsed[0]
+                
+        confidence = {'note': 1.0}
+        if date is None:
+            date = self.today()
+            confidence['date'] = 0.5
+        else:
+            confidence['date'] = 1.0
+            date = date.isoformat()
+        if amount is not None:
+            confidence['amount'] = 1.0
+        elif bare_amount is not None:
+            amount = bare_amount
+            confidence['amount'] = 0.7
+        else:
+            amount = 0.0
+            confidence['amount'] = 0.0
+        currency = found.get('currency', self.DEFAULT_CURRENCY)
+        confidence['currency'] = 1.0 if 'currency' in found else 0.6
+        predicted = None
+        if 'category' in found:
+            category = found['category']
+            confidence['category'] = 1.0
+        elif self.classifier is not None:
+            if words is None:
+                words = ledger_segmenter.lcut(text)
+            predicted = self.classifier.predict(words)
+        if predicted is not None:
+            category = predicted[0]
+            confidence['category'] = min(predicted[1], 0.9)
+        elif 'category' not in found:
+            category = self.DEFAULT_CATEGORY
+            confidence['category'] = 0.0
+        if 'type' in found:
+            type_ = found['type']
+            confidence['type'] = 1.0
+        elif category in self.income_categories:
+            # 没有说收支类型时按分类推断
+            type_ = '收入'
+            confidence['type'] = 0.8
+        else:
+            type_ = '支出'
+            confidence['type'] = 0.5
+            
+        if words is None:
+            words = ledger_segmenter.lcut(text)
+        return ExtractedRecord(date, amount, currency, type_, category, ' '.join(words), confidence)
+        
+    def extract_record(self, text):
+        """把一段识别文本转换为 (日期, 金额, 币种, 类型, 分类, 备注)"""
+        with voice_timings.measure('jieba'):
+            words = ledger_segmenter.lcut(text)
+        with voice_timings.measure('extract'):
+            return self.extract(text, words).values()
+            
+    def extract_lines(self, lines):
+        """批量提取，每行一条记录，空行跳过，返回 [(行号, ExtractedRecord)]，行号从1开始。
+        所有行拼成一段文本只分一次词，再按换行符把词切回各行"""
+        lines = [(number, line.strip()) for number, line in enumerate(lines, 1) if line.strip()]
+        if not lines:
+            return []
+        tokens = ledger_segmenter.lcut('\n'.join(text for _, text in lines))
+        if tokens.count('\n') != len(lines) - 1:
+            # 换行符没有被单独切出来时逐行分词
+            return [(number, self.extract(text)) for number, text in lines]
+        results = []
+        words = []
+        texts = iter(lines)
+        for token in tokens:
+            if token == '\n':
+                number, text = next(texts)
+                results.append((number, self.extract(text, words)))
+                words = []
+            else:
+                words.append(token)
+        number, text = next(texts)
+        results.append((number, self.extract(text, words)))
+        return results
+
+
+# 音频输入源：start 之后在自己的线程中不断调用 on_chunk(data, overflow)，
+# data 为 16kHz 单声道 16 位 PCM；blocking 为 True 的输入源在识别积压时等待而不是丢弃音频
+class AudioSource(ABC):
+    sample_rate = 16000
+    blocking = False
+    
+    @abstractmethod
+    def start(self, on_chunk, chunk_frames):
+        """开始采集，每块音频调用一次 on_chunk(data, overflow)"""
+        
+    @abstractmethod
+    def is_active(self):
+        """还在产生音频时返回 True"""
+        
+    @abstractmethod
+    def stop(self):
+        """停止采集并释放设备，可以重复调用"""
+
+
+# 麦克风输入：PyAudio 回调模式，PortAudio 线程只把音频交给 on_chunk
+class MicrophoneSource(AudioSource):
+    def __init__(self):
+        self.stream = None
+        self.active = False
+        self.on_chunk = None
+        
+    def start(self, on_chunk, chunk_frames):
+        self.on_chunk = on_chunk
+        self.active = True
+        self.stream = shared_pyaudio().open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=chunk_frames,
+            stream_callback=self.callback
+        )
+        self.stream.start_stream()
+        
+    def callback(self, in_data, frame_count, time_info, status):
+        self.on_chunk(in_data, bool(status & pyaudio.paInputOverflow))
+        return None, pyaudio.paContinue if self.active else pyaudio.paComplete
+        
+    def is_active(self):
+        stream = self.stream
+        return stream is not None and stream.is_active()
+        
+    def stop(self):
+        self.active = False
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+
+# WAV 文件回放：按实时速度或最快速度依次送出录音文件，用于无麦克风的回归测试和性能测试；
+# 文件之间插入 gap_seconds 秒静音，让端点检测把每个文件切分为一句
+class WavFileSource(AudioSource):
+    blocking = True
+    
+    def __init__(self, paths, realtime=False, gap_seconds=0.8):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.realtime = realtime
+        self.gap_seconds = gap_seconds
+        self.thread = None
+        self.active = False
+        
+    def start(self, on_chunk, chunk_frames):
+        for path in self.paths:
+            with wave.open(path, 'rb') as wf:
+                if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != self.sample_rate:
+                    raise ValueError(f"回放文件必须是 16kHz 单声道 16 位 WAV: {path}")
+        self.active = True
+        self.thread = threading.Thread(target=self.play, args=(on_chunk, chunk_frames), daemon=True)
+        self.thread.start()
+        
+    def play(self, on_chunk, chunk_frames):
+        chunk_seconds = chunk_frames / self.sample_rate
+        silence = bytes(chunk_frames * 2)
+        start = time.perf_counter()
+        played = 0
+        try:
+            for path in self.paths:
+                with wave.open(path, 'rb') as wf:
+                    chunks = iter(lambda: wf.readframes(chunk_frames), b'')
+                    gap = [silence] * int(self.gap_seconds / chunk_seconds)
+                    for data in list(chunks) + gap:
+                        if not self.active:
+                            return
+                        if self.realtime:
+                            # 按音频时间轴送出，保持与麦克风相同的节奏
+                            delay = start + played * chunk_seconds - time.perf_counter()
+                            if delay > 0:
+                                time.sleep(delay)
+                        on_chunk(data, False)
+                        played += 1
+        finally:
+            self.active = False
+            
+    def is_active(self):
+        return self.active
+        
+    def stop(self):
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(1.0)
+
+
 # 语音识别线程类
 class VoiceRecognition(QThread):
     recognized_text = Signal(str)
+    partial_text = Signal(str)
     recording_stopped = Signal()
     
-    def __init__(self, model_path="resources/vosk-model-small-cn-0.22", timeout=20):
+    SAMPLE_RATE = 16000
+    CHUNK_FRAMES = 1024
+    PARTIAL_SKIP_DEPTH = 4
+    
+    def __init__(self, model_path=VOICE_MODEL_PATH, timeout=20, buffer_seconds=30, record_path=None, vad=True,
+                 grammar=None, partial_interval=0.25, audio_source=None, auto_stop=True):
         super().__init__()
+        # 音频输入源，默认使用麦克风；测试时可换成 WavFileSource 回放录音
+        self.audio_source = audio_source or MicrophoneSource()
         self.model_path = model_path
+        # 中间结果最多每 partial_interval 秒发送一次，PartialResult 本身也有解码开销
+        self.partial_interval = partial_interval
+        self.last_partial_time = 0.0
+        self.last_partial = ""
+        # grammar 为短语列表时使用受限识别，录音过程中可以通过 set_grammar 切换
+        self.grammar = grammar
+        self._grammar_changed = False
+        # vad 为 True 时跳过静音并在说话结束后自动停止；timeout 仍作为录音时长上限
+        # auto_stop 为 False 时只跳过静音、不自动停止，timeout 为 None 表示不限时长，由用户手动停止
+        self.vad = vad
+        self.auto_stop = auto_stop
+        self.endpointer = None
+        self.emitted_texts = 0
         self.is_recording = False
         self._stop_requested = False  # 停止请求标志
-        self.frames = []
+        # 只保留最近 buffer_seconds 秒的音频，用于重新识别或保存
+        self.audio_buffer = AudioRingBuffer(buffer_seconds, self.SAMPLE_RATE)
+        # 指定 record_path 时整段录音边录边写入WAV文件
+        self.record_path = record_path
+        self.wav_writer = None
         self.start_time = 0
         self.timeout = timeout
         self.recognizer = None
-        self.p = None
-        self.stream = None
+        self.pending_bytes = 0
+        self.timed_out = False
+        self.reset_capture_stats()
         
     def run(self):
         try:
-            print("正在加载语音识别模型...")
-            self.recognizer = vosk.KaldiRecognizer(vosk.Model(self.model_path), 16000)
-            self.p = pyaudio.PyAudio()
-            self.stream = self.p.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=16000,
-                input=True,
-                frames_per_buffer=1024
-            )
-            print("模型加载成功，开始录音...")
+            # 先打开麦克风；模型若仍在预热中，音频先缓存在环形缓冲区中，模型就绪后再补送识别
+            self.recognizer = None
+            self.pending_bytes = 0
+            self.timed_out = False
+            self.reset_capture_stats()
+            voice_timings.start_session()
+            device_start = time.perf_counter()
+            print("开始录音...")
             self.is_recording = True
-            self.frames = []
+            self.audio_buffer.clear()
+            self.endpointer = SpeechEndpointer(self.SAMPLE_RATE, self.CHUNK_FRAMES) if self.vad else None
+            self.emitted_texts = 0
+            self.open_wav_writer()
             self.start_time = time.time()
+            # 输入源在自己的线程中采集并把音频放入队列，识别在本线程中进行，
+            # 识别变慢时只会增加延迟，不会导致输入溢出而中断录音
+            self.audio_source.start(self.audio_callback, self.CHUNK_FRAMES)
+            voice_timings.record('device_open', time.perf_counter() - device_start)
             
             while self.is_recording and not self._stop_requested:
                 try:
-                    data = self.stream.read(1024)
-                except IOError as e:
-                    print(f"音频流读取错误: {e}")
+                    data = self.audio_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if not self.audio_source.is_active():
+                        print("音频流已停止")
+                        break
+                    continue
+                self.max_queue_depth = max(self.max_queue_depth, self.audio_queue.qsize() + 1)
+                if not self.process_chunk(data):
                     break
                     
-                self.frames.append(data)
-                elapsed_time = time.time() - self.start_time
-                
-                if elapsed_time >= self.timeout:
-                    print(f"录音超时，自动停止...（已录音 {elapsed_time:.1f} 秒）")
-                    self.is_recording = False
-                    self.recognized_text.emit("")
+            # 停止采集后，把队列中已经采集但还没识别的音频处理完；这一步在识别线程中进行，
+            # 界面线程的 stop_recording 不等待，处理完成后发出 recording_stopped
+            self.is_recording = False
+            while not self.timed_out:
+                try:
+                    data = self.audio_queue.get_nowait()
+                except queue.Empty:
                     break
-                    
-                if self.recognizer.AcceptWaveform(data):
-                    result = json.loads(self.recognizer.Result())
-                    text = result.get("text", "")
-                    if text:
-                        self.recognized_text.emit(text)
-                
-                if self._stop_requested:
+                if not self.process_chunk(data):
                     break
             
             print("语音识别结束，处理识别结果...")
-            result = json.loads(self.recognizer.FinalResult())
+            if self.recognizer is None:
+                # 录音结束时模型仍未就绪，等待加载完成后识别缓存的音频
+                self.recognizer = self.create_recognizer()
+                self.feed_backlog(self.pending_bytes)
+            result = self.final_result()
             recognized_text = result.get("text", "")
-            self.recognized_text.emit(recognized_text)
+            # 已经按句输出过结果时，结尾的空结果不再上报
+            if recognized_text or not self.emitted_texts:
+                self.recognized_text.emit(recognized_text)
+            if self.endpointer is not None:
+                print(f"端点检测: 送入识别 {self.endpointer.voiced_chunks} 帧语音，"
+                      f"跳过 {self.endpointer.skipped_chunks} 帧静音")
+            stats = self.capture_stats()
+            print(f"音频采集: {stats['chunks_captured']} 块，输入溢出 {stats['input_overflows']} 次，"
+                  f"丢弃 {stats['dropped_chunks']} 块，队列最长积压 {stats['max_queue_seconds']:.2f} 秒")
             self.stop_recording()
             self.recording_stopped.emit()
             
@@ -107,36 +1479,260 @@ class VoiceRecognition(QThread):
             print("语音识别线程出错:", e)
             self.recording_stopped.emit()
             
+        finally:
+            self.close_wav_writer()
+            
+    def audio_callback(self, data, overflow):
+        """在输入源的采集线程中调用，只做入队，不能有耗时操作"""
+        self.chunks_captured += 1
+        if overflow:
+            self.input_overflows += 1
+        if self.audio_source.blocking:
+            # 回放文件时等待识别跟上，保证不丢音频
+            while self.audio_queue.qsize() >= self.max_queue_chunks and self.is_recording:
+                time.sleep(0.005)
+        if self.audio_queue.qsize() >= self.max_queue_chunks:
+            # 积压超过缓冲区长度说明识别严重跟不上，只能丢弃
+            self.dropped_chunks += 1
+        else:
+            self.audio_queue.put(data)
+        
+    def reset_capture_stats(self):
+        self.audio_queue = queue.SimpleQueue()
+        self.max_queue_chunks = max(1, self.audio_buffer.capacity // (self.CHUNK_FRAMES * 2))
+        self.chunks_captured = 0
+        self.input_overflows = 0
+        self.dropped_chunks = 0
+        self.max_queue_depth = 0
+        
+    def capture_stats(self):
+        """采集统计：输入溢出、丢弃块数以及队列积压（反映识别跟不上采集的程度）"""
+        chunk_seconds = self.CHUNK_FRAMES / self.SAMPLE_RATE
+        return {
+            'chunks_captured': self.chunks_captured,
+            'input_overflows': self.input_overflows,
+            'dropped_chunks': self.dropped_chunks,
+            'queue_seconds': self.audio_queue.qsize() * chunk_seconds,
+            'max_queue_seconds': self.max_queue_depth * chunk_seconds
+        }
+        
+    def process_chunk(self, data):
+        """处理一块采集到的音频，录音应当结束时返回False"""
+        voice_timings.mark('first_frame')
+        self.audio_buffer.write(data)
+        if self.wav_writer is not None:
+            self.wav_writer.writeframes(data)
+        # 按已采集的音频时长计时：识别有积压时，超时前采集到的音频仍会全部识别
+        elapsed_time = self.audio_buffer.total_bytes / (self.SAMPLE_RATE * 2)
+        
+        if self.timeout is not None and elapsed_time >= self.timeout:
+            print(f"录音超时，自动停止...（已录音 {elapsed_time:.1f} 秒）")
+            self.timed_out = True
+            self.recognized_text.emit("")
+            return False
+            
+        if self.recognizer is None:
+            self.pending_bytes += len(data)
+            if not voice_models.is_ready(self.model_path):
+                return True
+            self.recognizer = self.create_recognizer()
+            self.feed_backlog(self.pending_bytes)
+        else:
+            self.handle_chunk(data)
+            
+        # 停止后处理积压的音频时不再按静音自动停止，否则积压中后面的话会被丢掉
+        if self.auto_stop and self.is_recording and self.endpointer is not None and self.endpointer.should_stop():
+            print("检测到说话结束，自动停止录音")
+            return False
+        return True
+        
+    def feed_backlog(self, pending_bytes):
+        """把模型就绪前缓存的音频补送给识别器；超出缓冲区长度的部分已被覆盖"""
+        if pending_bytes > self.audio_buffer.size:
+            print(f"模型加载期间的音频超过缓冲区长度，最早的 "
+                  f"{(pending_bytes - self.audio_buffer.size) / (self.SAMPLE_RATE * 2):.1f} 秒已丢弃")
+        backlog = self.audio_buffer.read_last(pending_bytes)
+        print(f"模型已就绪，补送缓存的 {len(backlog) / (self.SAMPLE_RATE * 2):.1f} 秒音频")
+        step = self.CHUNK_FRAMES * 2
+        for offset in range(0, len(backlog), step):
+            self.handle_chunk(backlog[offset:offset + step])
+            
+    def handle_chunk(self, data):
+        if self.endpointer is None:
+            self.accept_waveform(data)
+            return
+        chunks, utterance_end = self.endpointer.process(data)
+        for chunk in chunks:
+            self.accept_waveform(chunk)
+        if utterance_end:
+            # 一句话结束，立即取出这句的结果，不必等整段录音结束
+            result = self.final_result()
+            self.emit_text(result.get("text", ""))
+            self.apply_grammar()
+            
+    def set_grammar(self, grammar):
+        """切换受限/自由识别模式，grammar 为None时切回完整词表；
+        录音中切换时在当前这句话结束后生效，不打断正在识别的句子"""
+        self.grammar = grammar
+        self._grammar_changed = True
+        
+    def apply_grammar(self):
+        if self._grammar_changed and self.recognizer is not None:
+            self._grammar_changed = False
+            self.recognizer = self.create_recognizer()
+            print("已切换为" + ("受限识别模式" if self.grammar else "自由识别模式"))
+            
+    def create_recognizer(self):
+        with voice_timings.measure('model_acquire'):
+            return voice_models.create_recognizer(self.model_path, self.SAMPLE_RATE, self.grammar)
+            
+    def final_result(self):
+        with voice_timings.measure('final_result'):
+            return json.loads(self.recognizer.FinalResult())
+            
+    def accept_waveform(self, data):
+        with voice_timings.measure('accept_waveform'):
+            accepted = self.recognizer.AcceptWaveform(data)
+        if accepted:
+            result = json.loads(self.recognizer.Result())
+            self.emit_text(result.get("text", ""))
+        else:
+            self.emit_partial()
+            
+    def emit_partial(self):
+        now = time.monotonic()
+        if self.partial_interval is None or now - self.last_partial_time < self.partial_interval:
+            return
+        if self.audio_queue.qsize() > self.PARTIAL_SKIP_DEPTH:
+            # 识别积压时先不取中间结果，把时间留给解码
+            return
+        self.last_partial_time = now
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if partial and partial != self.last_partial:
+            self.last_partial = partial
+            self.partial_text.emit(partial)
+            
+    def emit_text(self, text):
+        # 一句话有了最终结果，下一句的中间结果重新开始
+        self.last_partial = ""
+        if text:
+            self.emitted_texts += 1
+            self.recognized_text.emit(text)
+                
+    def open_wav_writer(self):
+        if self.record_path:
+            self.wav_writer = wave.open(self.record_path, "wb")
+            self.wav_writer.setnchannels(1)
+            self.wav_writer.setsampwidth(2)
+            self.wav_writer.setframerate(self.SAMPLE_RATE)
+            
+    def close_wav_writer(self):
+        if self.wav_writer is not None:
+            self.wav_writer.close()
+            self.wav_writer = None
+            
     def stop_recording(self):
+        """请求停止：只设置标志并停止输入源，不等待线程结束，可以在界面线程中调用。
+        已采集的音频和仍在预热的模型由识别线程继续处理，完成后发出 recording_stopped"""
         try:
             self.is_recording = False
             self._stop_requested = True
             
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
-                
-            if self.p:
-                self.p.terminate()
-                
-            self.quit()
-            self.wait()
+            # PyAudio 实例在进程内共用，这里不再 terminate
+            self.audio_source.stop()
             print("音频资源已释放")
             
         except Exception as e:
             print("停止录音时出错:", e)
             
     def save_audio(self, filename):
+        """保存环形缓冲区中最近的音频"""
         print(f"保存音频到文件: {filename}")
         with wave.open(filename, "wb") as wf:
             wf.setnchannels(1)
-            wf.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(16000)
-            wf.writeframes(b"".join(self.frames))
+            wf.setsampwidth(2)
+            wf.setframerate(self.SAMPLE_RATE)
+            wf.writeframes(self.audio_buffer.read_last())
+
+
+# 批量转写：每个工作进程加载一次模型，之后该进程处理的所有文件共用
+_transcriber_config = None
+
+
+def _init_transcriber(model_path, grammar):
+    global _transcriber_config
+    _transcriber_config = (model_path, grammar)
+    voice_models.get_model(model_path)
+
+
+def transcribe_audio_file(path):
+    """在工作进程中识别一个WAV文件，返回该文件的转写结果"""
+    model_path, grammar = _transcriber_config
+    result = {'file': path, 'text': '', 'audio_seconds': 0.0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    try:
+        with wave.open(path, 'rb') as wf:
+            if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError("只支持16位单声道WAV文件")
+            sample_rate = wf.getframerate()
+            result['audio_seconds'] = wf.getnframes() / sample_rate
+            recognizer = voice_models.create_recognizer(model_path, sample_rate, grammar)
+            texts = []
+            while True:
+                data = wf.readframes(4000)
+                if not data:
+                    break
+                if recognizer.AcceptWaveform(data):
+                    texts.append(json.loads(recognizer.Result()).get("text", ""))
+            texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        result['text'] = ' '.join(text for text in texts if text)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+# 批量转写线程：把WAV文件分发给进程池识别，按完成顺序报告进度
+class BatchTranscription(QThread):
+    progress = Signal(int, int)
+    transcribed = Signal(list)
+    
+    def __init__(self, files, model_path=VOICE_MODEL_PATH, grammar=None, workers=None):
+        super().__init__()
+        self.files = list(files)
+        self.model_path = model_path
+        self.grammar = grammar
+        self.workers = workers or os.cpu_count() or 1
+        self.elapsed = 0.0
+        
+    def run(self):
+        results = []
+        start = time.perf_counter()
+        try:
+            workers = max(1, min(self.workers, len(self.files)))
+            # 用 spawn 启动工作进程：fork 会把Qt状态和正在后台加载的模型一起复制进子进程，
+            # 子进程中的加载事件永远等不到，初始化会一直阻塞
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_transcriber,
+                                     initargs=(self.model_path, self.grammar),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(transcribe_audio_file, path) for path in self.files]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    self.progress.emit(len(results), len(self.files))
+        except Exception as e:
+            print(f"批量转写出错: {e}")
+            done = {result['file'] for result in results}
+            results.extend({'file': path, 'text': '', 'audio_seconds': 0.0, 'seconds': 0.0, 'error': str(e)}
+                           for path in self.files if path not in done)
+        self.elapsed = time.perf_counter() - start
+        results.sort(key=lambda result: self.files.index(result['file']))
+        self.transcribed.emit(results)
 
 
 # 加密管理类
 class EncryptionManager:
+    KEY_CHECK_LABEL = b'PennAicoin jzrj key check'
+    
     def __init__(self):
         self.salt = os.urandom(16)
         self.iterations = 100000
@@ -161,27 +1757,46 @@ class EncryptionManager:
         return kdf
         
     def encrypt_data(self, data, aes_key, public_key):
-        iv = os.urandom(self.block_size // 8)
-        cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
-        padder = padding.PKCS7(self.block_size).padder()
-        padded_data = padder.update(data) + padder.finalize()
-        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
+        iv, ciphertext = self.encrypt_chunk(data, aes_key)
+        key_header = self.build_key_header(aes_key, public_key)
+        
+        return {
+            'salt': key_header['salt'],
+            'iterations': key_header['iterations'],
+            'iv': base64.b64encode(iv).decode('utf-8'),
+            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+            'encrypted_aes_key': key_header['encrypted_aes_key'],
+            'rsa_public_key': key_header['rsa_public_key']
+        }
+        
+    def decrypt_data(self, encrypted_data, password, private_key):
+        try:
+            aes_key = self.unlock_aes_key(encrypted_data, password, private_key)
+            iv = base64.b64decode(encrypted_data['iv'])
+            ciphertext = base64.b64decode(encrypted_data['ciphertext'])
+            return self.decrypt_chunk(ciphertext, aes_key, iv)
+            
+        except Exception as e:
+            print(f"解密失败: {e}")
+            return None
+            
+    def rsa_padding(self):
+        return asymmetric_padding.OAEP(
+            mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None
+        )
         
+    def build_key_header(self, aes_key, public_key):
+        """生成写入文件头的密钥信息：盐值、迭代次数以及RSA加密后的AES密钥"""
         rsa_cipher = public_key.encrypt(
             aes_key,
-            asymmetric_padding.OAEP(
-                mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
+            self.rsa_padding()
         )
         
         return {
             'salt': base64.b64encode(self.salt).decode('utf-8'),
             'iterations': self.iterations,
-            'iv': base64.b64encode(iv).decode('utf-8'),
-            'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
             'encrypted_aes_key': base64.b64encode(rsa_cipher).decode('utf-8'),
             'rsa_public_key': base64.b64encode(public_key.public_bytes(
                 encoding=serialization.Encoding.PEM,
@@ -189,45 +1804,387 @@ class EncryptionManager:
             )).decode('utf-8')
         }
         
-    def decrypt_data(self, encrypted_data, password, private_key):
-        try:
-            salt = base64.b64decode(encrypted_data['salt'])
-            iterations = encrypted_data['iterations']
-            iv = base64.b64decode(encrypted_data['iv'])
-            ciphertext = base64.b64decode(encrypted_data['ciphertext'])
-            encrypted_aes_key = base64.b64decode(encrypted_data['encrypted_aes_key'])
-            rsa_public_key = base64.b64decode(encrypted_data['rsa_public_key'])
-            
-            kdf = hashlib.pbkdf2_hmac(
-                'sha256',
-                password.encode('utf-8'),
-                salt,
-                iterations
-            )
-            
-            decrypted_aes_key = private_key.decrypt(
-                encrypted_aes_key,
-                asymmetric_padding.OAEP(
-                    mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
+    def unlock_aes_key(self, key_header, password, private_key):
+        """校验密码并取出AES密钥，密码错误时抛出ValueError"""
+        salt = base64.b64decode(key_header['salt'])
+        iterations = key_header['iterations']
+        encrypted_aes_key = base64.b64decode(key_header['encrypted_aes_key'])
+        
+        kdf = hashlib.pbkdf2_hmac(
+            'sha256',
+            password.encode('utf-8'),
+            salt,
+            iterations
+        )
+        
+        decrypted_aes_key = private_key.decrypt(
+            encrypted_aes_key,
+            self.rsa_padding()
+        )
+        
+        if decrypted_aes_key != kdf:
+            raise ValueError("密码错误或密钥不匹配")
+        return decrypted_aes_key
+        
+    def generate_data_key(self):
+        """每个归档使用独立的随机数据密钥"""
+        return os.urandom(32)
+        
+    def derive_key_encryption_key(self, password, salt=None, iterations=None):
+        """由密码派生用于包装数据密钥的密钥，返回 (salt, iterations, kek)"""
+        salt = os.urandom(16) if salt is None else salt
+        iterations = iterations or self.iterations
+        kek = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+        return salt, iterations, kek
+        
+    def public_key_fingerprint(self, public_key):
+        return hashlib.sha256(public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )).hexdigest()
+        
+    def key_check_value(self, kek):
+        """密码校验值：只依赖派生密钥，可在读取任何数据之前判断密码是否正确"""
+        return hmac.new(kek, self.KEY_CHECK_LABEL, hashlib.sha256).digest()[:8]
+        
+    def password_kek(self, slot, password, kek_cache=None):
+        """按密钥块中的盐值派生密钥，并用校验值确认密码，错误时抛出ValueError；
+        没有校验值的密钥块通过解包数据密钥确认"""
+        cache_key = (slot['salt'], slot['iterations'])
+        if kek_cache is not None and cache_key in kek_cache:
+            kek = kek_cache[cache_key]
+        else:
+            _, _, kek = self.derive_key_encryption_key(
+                password, base64.b64decode(slot['salt']), slot['iterations']
             )
-            
-            if decrypted_aes_key != kdf:
+        if 'key_check' in slot:
+            if not hmac.compare_digest(self.key_check_value(kek), base64.b64decode(slot['key_check'])):
+                raise ValueError("密码错误")
+        else:
+            try:
+                aes_key_unwrap(kek, base64.b64decode(slot['wrapped_key']))
+            except InvalidUnwrap:
+                raise ValueError("密码错误")
+        if kek_cache is not None:
+            kek_cache[cache_key] = kek
+        return kek
+        
+    def build_key_block(self, data_key, password_kek=None, public_key=None):
+        """用密码派生的密钥和/或RSA公钥包装数据密钥，任一方式都可以解锁"""
+        key_block = {}
+        if password_kek is not None:
+            salt, iterations, kek = password_kek
+            key_block['password'] = {
+                'kdf': 'pbkdf2-sha256',
+                'salt': base64.b64encode(salt).decode('utf-8'),
+                'iterations': iterations,
+                'key_check': base64.b64encode(self.key_check_value(kek)).decode('utf-8'),
+                'wrapped_key': base64.b64encode(aes_key_wrap(kek, data_key)).decode('utf-8')
+            }
+        if public_key is not None:
+            key_block['rsa'] = {
+                'public_key_sha256': self.public_key_fingerprint(public_key),
+                'wrapped_key': base64.b64encode(public_key.encrypt(data_key, self.rsa_padding())).decode('utf-8')
+            }
+        return key_block
+        
+    def unwrap_data_key(self, key_block, password=None, private_key=None, kek_cache=None):
+        """解开数据密钥，密码或私钥不匹配时抛出ValueError；kek_cache 按盐值缓存派生结果"""
+        if password is not None and 'password' in key_block:
+            slot = key_block['password']
+            kek = self.password_kek(slot, password, kek_cache)
+            try:
+                return aes_key_unwrap(kek, base64.b64decode(slot['wrapped_key']))
+            except InvalidUnwrap:
                 raise ValueError("密码错误或密钥不匹配")
                 
-            cipher = Cipher(algorithms.AES(decrypted_aes_key), modes.CBC(iv), backend=default_backend())
-            decryptor = cipher.decryptor()
-            padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-            unpadder = padding.PKCS7(self.block_size).unpadder()
-            plaintext = unpadder.update(padded_plaintext) + unpadder.finalize()
+        if private_key is not None and 'rsa' in key_block:
+            slot = key_block['rsa']
+            if slot['public_key_sha256'] != self.public_key_fingerprint(private_key.public_key()):
+                raise ValueError("私钥与归档不匹配")
+            return private_key.decrypt(base64.b64decode(slot['wrapped_key']), self.rsa_padding())
+            
+        raise ValueError("没有可用于解锁归档的密码或私钥")
+        
+    def encrypt_chunk(self, data, aes_key):
+        """使用独立IV加密一段数据，返回 (iv, ciphertext)"""
+        iv = os.urandom(self.block_size // 8)
+        cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
+        encryptor = cipher.encryptor()
+        padder = padding.PKCS7(self.block_size).padder()
+        padded_data = padder.update(data) + padder.finalize()
+        ciphertext = encryptor.update(padded_data) + encryptor.finalize()
+        return iv, ciphertext
+        
+    def decrypt_chunk(self, ciphertext, aes_key, iv):
+        cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
+        decryptor = cipher.decryptor()
+        padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        unpadder = padding.PKCS7(self.block_size).unpadder()
+        return unpadder.update(padded_plaintext) + unpadder.finalize()
+
+
+# .jzrj 分块归档格式：
+#   文件头  JZRJ | 版本号 | 头部长度 | 头部JSON（列名、压缩方式等）
+#   密钥块  固定预留大小，保存被密码派生密钥/RSA公钥包装的数据密钥，可原地改写
+#   数据块  每块若干行CSV，按头部记录的方式压缩后使用独立IV加密
+#   块索引  JSON，记录每块的偏移、长度、起始行号、IV与密文SHA256
+#   文件尾  索引偏移 | 索引长度 | JZRJ
+# 打开归档只需读取头部和索引，任意一行都可以只解密所在的块得到。
+# 归档摘要只覆盖头部和索引，不含密钥块，因此更换密码不影响.hash文件和备份清单。
+# 版本2没有密钥块，密钥信息直接写在头部。
+JZRJ_MAGIC = b'JZRJ'
+JZRJ_VERSION = 3
+JZRJ_PREFIX = struct.Struct('<4sBI')
+JZRJ_KEYBLOCK_LEN = struct.Struct('<I')
+JZRJ_KEYBLOCK_SIZE = 2048
+JZRJ_TRAILER = struct.Struct('<QI4s')
+JZRJ_ROWS_PER_CHUNK = 2048
+RECORD_COLUMNS = ['id', 'date', 'amount', 'currency', 'type', 'category', 'note']
+RECORDS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        amount REAL,
+        currency TEXT,
+        type TEXT,
+        category TEXT,
+        note TEXT
+    )
+'''
+JZRJ_DEFAULT_CODEC = 'zlib'
+JZRJ_DEFAULT_LEVEL = 6
+
+
+# 数据块压缩：先压缩再加密，压缩方式记录在文件头中
+def jzrj_codecs():
+    """返回当前环境可用的压缩方式"""
+    codecs = ['none', 'zlib', 'bz2', 'lzma']
+    if zstandard is not None:
+        codecs.append('zstd')
+    return codecs
+
+
+def compress_chunk(data, codec, level):
+    if codec == 'none':
+        return data
+    if codec == 'zlib':
+        return zlib.compress(data, level)
+    if codec == 'bz2':
+        return bz2.compress(data, max(1, level))
+    if codec == 'lzma':
+        return lzma.compress(data, preset=level)
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"不支持的压缩方式: {codec}")
+
+
+def decompress_chunk(data, codec):
+    if codec == 'none':
+        return data
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'bz2':
+        return bz2.decompress(data)
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"不支持的压缩方式: {codec}")
+
+
+def encode_key_block(key_block):
+    """把密钥块编码为固定长度，便于原地改写"""
+    data = json.dumps(key_block).encode('utf-8')
+    if JZRJ_KEYBLOCK_LEN.size + len(data) > JZRJ_KEYBLOCK_SIZE:
+        raise ValueError("密钥块超出预留空间")
+    return (JZRJ_KEYBLOCK_LEN.pack(len(data)) + data).ljust(JZRJ_KEYBLOCK_SIZE, b'\0')
+
+
+def decode_key_block(data):
+    (length,) = JZRJ_KEYBLOCK_LEN.unpack(data[:JZRJ_KEYBLOCK_LEN.size])
+    return json.loads(data[JZRJ_KEYBLOCK_LEN.size:JZRJ_KEYBLOCK_LEN.size + length].decode('utf-8'))
+
+
+def fetch_batches(cursor, size=JZRJ_ROWS_PER_CHUNK):
+    """按块大小分批读取查询结果"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+# 加密归档写入类
+class JzrjArchiveWriter:
+    def __init__(self, file_path, header, key_block, aes_key, encryption_manager,
+                 codec=JZRJ_DEFAULT_CODEC, level=JZRJ_DEFAULT_LEVEL):
+        self.file_path = file_path
+        self.aes_key = aes_key
+        self.encryption_manager = encryption_manager
+        self.codec = codec
+        self.level = level
+        header = dict(header, compression={'codec': codec, 'level': level})
+        self.header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        self.chunks = []
+        self.row_count = 0
+        
+        self.file = open(file_path, 'wb')
+        self.file.write(JZRJ_PREFIX.pack(JZRJ_MAGIC, JZRJ_VERSION, len(self.header_bytes)))
+        self.file.write(self.header_bytes)
+        self.file.write(encode_key_block(key_block))
+        
+    def write_rows(self, rows):
+        """把一批记录加密为一个数据块写入文件"""
+        if not rows:
+            return
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        plaintext = buffer.getvalue().encode('utf-8')
+        iv, ciphertext = self.encryption_manager.encrypt_chunk(
+            compress_chunk(plaintext, self.codec, self.level), self.aes_key
+        )
+        
+        self.chunks.append({
+            'offset': self.file.tell(),
+            'length': len(ciphertext),
+            'first_row': self.row_count,
+            'rows': len(rows),
+            'size': len(plaintext),
+            'iv': base64.b64encode(iv).decode('utf-8'),
+            'sha256': hashlib.sha256(ciphertext).hexdigest()
+        })
+        self.file.write(ciphertext)
+        self.row_count += len(rows)
+        
+    def close(self):
+        """写入块索引和文件尾，返回归档摘要（头部+索引的SHA256）"""
+        index_bytes = json.dumps({'rows': self.row_count, 'chunks': self.chunks}).encode('utf-8')
+        index_offset = self.file.tell()
+        self.file.write(index_bytes)
+        self.file.write(JZRJ_TRAILER.pack(index_offset, len(index_bytes), JZRJ_MAGIC))
+        self.file.close()
+        return hashlib.sha256(self.header_bytes + index_bytes).hexdigest()
+        
+    def abort(self):
+        """写入失败时关闭并删除不完整的归档"""
+        self.file.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+
+# 加密归档读取类，按需解密数据块并缓存最近使用的块
+class JzrjArchiveReader:
+    def __init__(self, file_path, cache_chunks=32):
+        self.file_path = file_path
+        self.cache_chunks = cache_chunks
+        self.cache = OrderedDict()
+        self.aes_key = None
+        self.encryption_manager = EncryptionManager()
+        
+        self.file = open(file_path, 'rb')
+        try:
+            magic, self.version, header_len = JZRJ_PREFIX.unpack(self.file.read(JZRJ_PREFIX.size))
+            if magic != JZRJ_MAGIC:
+                raise ValueError("不是分块格式的.jzrj文件")
+            self.header_bytes = self.file.read(header_len)
+            self.header = json.loads(self.header_bytes.decode('utf-8'))
+            self.key_block_offset = self.file.tell()
+            self.key_block = None
+            if self.version >= 3:
+                self.key_block = decode_key_block(self.file.read(JZRJ_KEYBLOCK_SIZE))
+        except Exception:
+            self.file.close()
+            raise
             
-            return plaintext
+        self.columns = self.header.get('columns', RECORD_COLUMNS)
+        self.codec = self.header.get('compression', {}).get('codec', 'none')
+        # 块索引在密码校验通过后才读取，密码错误时不会读取文件头之外的任何内容
+        self.index_bytes = None
+        self.row_count = 0
+        self.chunks = None
+        self.chunk_starts = []
+        
+    def load_index(self):
+        if self.chunks is not None:
+            return
+        self.file.seek(-JZRJ_TRAILER.size, os.SEEK_END)
+        index_offset, index_len, end_magic = JZRJ_TRAILER.unpack(self.file.read(JZRJ_TRAILER.size))
+        if end_magic != JZRJ_MAGIC:
+            raise ValueError("归档文件不完整")
+        self.file.seek(index_offset)
+        self.index_bytes = self.file.read(index_len)
+        index = json.loads(self.index_bytes.decode('utf-8'))
+        self.row_count = index['rows']
+        self.chunks = index['chunks']
+        self.chunk_starts = [chunk['first_row'] for chunk in self.chunks]
+        
+    @staticmethod
+    def is_chunked(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read(len(JZRJ_MAGIC)) == JZRJ_MAGIC
             
-        except Exception as e:
-            print(f"解密失败: {e}")
+    def digest(self):
+        self.load_index()
+        return hashlib.sha256(self.header_bytes + self.index_bytes).hexdigest()
+        
+    def check_password(self, password, kek_cache=None):
+        """只用文件头中的校验值判断密码，不解开数据密钥也不读取数据"""
+        if self.key_block is None or 'password' not in self.key_block:
             return None
+        try:
+            self.encryption_manager.password_kek(self.key_block['password'], password, kek_cache)
+            return True
+        except ValueError:
+            return False
+            
+    def unlock(self, password, private_key=None, kek_cache=None):
+        if self.key_block is None:
+            self.aes_key = self.encryption_manager.unlock_aes_key(self.header, password, private_key)
+        else:
+            self.aes_key = self.encryption_manager.unwrap_data_key(self.key_block, password, private_key, kek_cache)
+        
+    def _decrypt_chunk(self, chunk_no):
+        chunk = self.chunks[chunk_no]
+        self.file.seek(chunk['offset'])
+        ciphertext = self.file.read(chunk['length'])
+        if hashlib.sha256(ciphertext).hexdigest() != chunk['sha256']:
+            raise ValueError(f"数据块 {chunk_no} 校验失败，文件可能被篡改")
+        plaintext = decompress_chunk(self.encryption_manager.decrypt_chunk(
+            ciphertext, self.aes_key, base64.b64decode(chunk['iv'])
+        ), self.codec)
+        return list(csv.reader(io.StringIO(plaintext.decode('utf-8'), newline='')))
+        
+    def read_chunk(self, chunk_no):
+        """读取一个数据块，结果放入LRU缓存"""
+        rows = self.cache.get(chunk_no)
+        if rows is not None:
+            self.cache.move_to_end(chunk_no)
+            return rows
+        rows = self._decrypt_chunk(chunk_no)
+        self.cache[chunk_no] = rows
+        if len(self.cache) > self.cache_chunks:
+            self.cache.popitem(last=False)
+        return rows
+        
+    def row(self, row_no):
+        self.load_index()
+        chunk_no = bisect.bisect_right(self.chunk_starts, row_no) - 1
+        return self.read_chunk(chunk_no)[row_no - self.chunk_starts[chunk_no]]
+        
+    def iter_chunks(self):
+        """顺序解密全部数据块，不经过缓存，用于流式导入"""
+        self.load_index()
+        for chunk_no in range(len(self.chunks)):
+            yield self._decrypt_chunk(chunk_no)
+            
+    def iter_rows(self):
+        for rows in self.iter_chunks():
+            yield from rows
+            
+    def close(self):
+        self.cache.clear()
+        self.file.close()
 
 
 # 文件管理类
@@ -263,16 +2220,7 @@ class FileManager:
             with open(self.file_path, 'r') as f:
                 encrypted_data = json.load(f)
                 
-            # 从文件中加载私钥
-            if self.private_key is None:
-                with open("private_key.pem", "rb") as key_file:
-                    self.private_key = serialization.load_pem_private_key(
-                        key_file.read(),
-                        password=None,
-                        backend=default_backend()
-                    )
-                    
-            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data, password, self.private_key)
+            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data, password, self.load_private_key())
             return decrypted_data
             
         except Exception as e:
@@ -299,100 +2247,213 @@ class FileManager:
             with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
                 reader = csv.reader(csvfile)
                 next(reader)  # 跳过表头
-                
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM records")
-                
-                for row in reader:
-                    cursor.execute(
-                        "INSERT INTO records (id, date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?,?)",
-                        tuple(row)
-                    )
-                    
-                conn.commit()
-                conn.close()
-                return True
+                return self.replace_records(db_path, reader)
                 
         except Exception as e:
             print(f"导入CSV文件失败: {e}")
             return False
             
-    def export_to_jzrj(self, db_path, original_file_name, password):
+    def replace_records(self, db_path, rows):
+        """在同一个事务中清空并批量写入记录，任何一行失败都会整体回滚"""
+        conn = sqlite3.connect(db_path)
         try:
-            # 导出CSV文件
-            csv_file_name = f"{original_file_name}.csv"
-            if not self.export_to_csv(db_path, csv_file_name):
-                return False
-                
-            # 读取CSV文件内容
-            with open(csv_file_name, 'r', encoding='utf-8') as f:
-                csv_data = f.read().encode('utf-8')
-                
-            # 生成RSA密钥对
-            private_key, public_key = self.encryption_manager.generate_rsa_key_pair()
-            
-            # 生成AES密钥
-            aes_key = self.encryption_manager.derive_aes_key(password)
-            
-            # 加密CSV数据
-            encrypted_data = self.encryption_manager.encrypt_data(csv_data, aes_key, public_key)
-            
-            # 创建.jzrj文件
-            jzrj_file_name = f"{original_file_name}.jzrj"
-            with open(jzrj_file_name, 'w') as f:
-                json.dump(encrypted_data, f)
-                
-            # 计算哈希值
-            with open(jzrj_file_name, 'rb') as f:
-                jzrj_data = f.read()
-                
-            hash_value = hashlib.sha256(jzrj_data).hexdigest()
-            
-            # 创建哈希值文件
-            hash_file_name = f"{original_file_name}.jzrj.hash"
-            with open(hash_file_name, 'w') as f:
-                f.write(hash_value)
-                
-            # 删除临时CSV文件
-            os.remove(csv_file_name)
+            with conn:
+                conn.execute("DELETE FROM records")
+                conn.executemany(
+                    "INSERT INTO records (id, date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?,?)",
+                    (tuple(row) for row in rows)
+                )
+            return True
+        finally:
+            conn.close()
             
-            # 保存私钥到文件
+    def load_private_key(self):
+        """从文件中加载私钥，已加载时直接返回"""
+        if self.private_key is None:
+            with open("private_key.pem", "rb") as key_file:
+                self.private_key = serialization.load_pem_private_key(
+                    key_file.read(),
+                    password=None,
+                    backend=default_backend()
+                )
+        return self.private_key
+        
+    def load_or_create_key_pair(self):
+        """复用已保存的RSA私钥，不存在时生成新的密钥对并保存，保证旧归档仍可解密"""
+        if self.private_key is None and not os.path.exists("private_key.pem"):
+            self.private_key, self.public_key = self.encryption_manager.generate_rsa_key_pair()
             with open("private_key.pem", "wb") as key_file:
                 key_file.write(
-                    private_key.private_bytes(
+                    self.private_key.private_bytes(
                         encoding=serialization.Encoding.PEM,
                         format=serialization.PrivateFormat.TraditionalOpenSSL,
                         encryption_algorithm=serialization.NoEncryption()
                     )
                 )
-                
+        private_key = self.load_private_key()
+        return private_key, private_key.public_key()
+        
+    def write_jzrj(self, jzrj_file_name, password, batches, columns=RECORD_COLUMNS,
+                   codec=JZRJ_DEFAULT_CODEC, level=JZRJ_DEFAULT_LEVEL, extra_header=None):
+        """把分批的记录写成加密归档及其.hash文件，返回归档摘要"""
+        private_key, public_key = self.load_or_create_key_pair()
+        
+        # 随机数据密钥加密数据块，再分别用密码派生密钥和RSA公钥包装
+        data_key = self.encryption_manager.generate_data_key()
+        key_block = self.encryption_manager.build_key_block(
+            data_key, self.encryption_manager.derive_key_encryption_key(password), public_key
+        )
+        
+        header = {
+            'format': 'jzrj',
+            'version': JZRJ_VERSION,
+            'columns': columns,
+            'cipher': 'AES-256-CBC',
+            'key_wrap': 'AES-KW/RSA-OAEP',
+            'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        }
+        header.update(extra_header or {})
+        
+        writer = JzrjArchiveWriter(jzrj_file_name, header, key_block, data_key,
+                                   self.encryption_manager, codec, level)
+        try:
+            for rows in batches:
+                writer.write_rows(rows)
+            hash_value = writer.close()
+        except Exception:
+            writer.abort()
+            raise
+            
+        # 创建哈希值文件
+        with open(f"{jzrj_file_name}.hash", 'w') as f:
+            f.write(hash_value)
+        return hash_value
+        
+    def export_to_jzrj(self, db_path, original_file_name, password,
+                       codec=JZRJ_DEFAULT_CODEC, level=JZRJ_DEFAULT_LEVEL):
+        try:
+            # 逐块读取数据库并加密写入.jzrj文件，明文不落盘
+            conn = sqlite3.connect(db_path)
+            try:
+                cursor = conn.execute("SELECT * FROM records")
+                self.write_jzrj(f"{original_file_name}.jzrj", password, fetch_batches(cursor),
+                                codec=codec, level=level)
+            finally:
+                conn.close()
             return True
             
         except Exception as e:
             print(f"导出到.jzrj文件时出错: {e}")
             return False
             
-    def import_from_jzrj(self, jzrj_file_path, password):
+    def read_expected_hash(self, jzrj_file_path):
+        """读取与归档同名的.hash文件，不存在时返回None"""
+        hash_file_name = f"{os.path.splitext(jzrj_file_path)[0]}.jzrj.hash"
+        if not os.path.exists(hash_file_name):
+            print(f"哈希值文件不存在: {hash_file_name}")
+            return None
+        with open(hash_file_name, 'r') as f:
+            return f.read().strip()
+            
+    def open_jzrj(self, jzrj_file_path, password, expected_hash=None, kek_cache=None):
+        """打开分块格式的.jzrj归档：校验头部与块索引摘要并解锁密钥，不读取数据块"""
+        if expected_hash is None:
+            expected_hash = self.read_expected_hash(jzrj_file_path)
+        if expected_hash is None:
+            raise ValueError("缺少哈希值文件")
+            
+        archive = JzrjArchiveReader(jzrj_file_path)
+        try:
+            # 先用文件头校验密码，密码错误时不再读取索引和数据块；版本2的归档仍需私钥配合密码解锁
+            archive.unlock(password, self.load_private_key() if archive.key_block is None else None, kek_cache)
+            if archive.digest() != expected_hash:
+                raise ValueError("哈希值不匹配，文件可能被篡改！")
+        except Exception:
+            archive.close()
+            raise
+        return archive
+        
+    def check_jzrj_password(self, jzrj_file_path, password, kek_cache=None):
+        """在读取数据之前校验密码；没有校验值的旧格式退回到完整的密钥校验"""
+        try:
+            if JzrjArchiveReader.is_chunked(jzrj_file_path):
+                archive = JzrjArchiveReader(jzrj_file_path)
+                try:
+                    result = archive.check_password(password, kek_cache)
+                    if result is None:
+                        archive.unlock(password, self.load_private_key())
+                        result = True
+                    return result
+                finally:
+                    archive.close()
+                    
+            with open(jzrj_file_path, 'r') as f:
+                encrypted_data = json.load(f)
+            self.encryption_manager.unlock_aes_key(encrypted_data, password, self.load_private_key())
+            return True
+            
+        except Exception as e:
+            print(f"校验密码失败: {e}")
+            return False
+            
+    def rewrap_jzrj(self, jzrj_file_path, new_password_kek, old_password=None, public_key=None, kek_cache=None):
+        """只改写归档的密钥块；未提供旧密码时用本地私钥解开数据密钥"""
+        with open(jzrj_file_path, 'r+b') as f:
+            magic, version, header_len = JZRJ_PREFIX.unpack(f.read(JZRJ_PREFIX.size))
+            if magic != JZRJ_MAGIC or version < 3:
+                raise ValueError("该归档没有独立的密钥块，请重新导出后再更换密码")
+            key_block_offset = JZRJ_PREFIX.size + header_len
+            f.seek(key_block_offset)
+            key_block = decode_key_block(f.read(JZRJ_KEYBLOCK_SIZE))
+            
+            private_key = None if old_password is not None else self.load_private_key()
+            data_key = self.encryption_manager.unwrap_data_key(key_block, old_password, private_key, kek_cache)
+            new_block = encode_key_block(
+                self.encryption_manager.build_key_block(data_key, new_password_kek, public_key)
+            )
+            
+            f.seek(key_block_offset)
+            f.write(new_block)
+            f.flush()
+            os.fsync(f.fileno())
+            
+    def change_jzrj_password(self, jzrj_file_paths, new_password, old_password=None):
+        """批量更换归档密码，数据块保持不变；返回 {文件路径: 是否成功}"""
+        # 新密码只派生一次，同一批归档共用盐值，旧密码的派生结果按盐值缓存
+        new_password_kek = self.encryption_manager.derive_key_encryption_key(new_password)
+        _, public_key = self.load_or_create_key_pair()
+        kek_cache = {}
+        
+        results = {}
+        for jzrj_file_path in jzrj_file_paths:
+            try:
+                self.rewrap_jzrj(jzrj_file_path, new_password_kek, old_password, public_key, kek_cache)
+                results[jzrj_file_path] = True
+            except Exception as e:
+                print(f"更换密码失败 {jzrj_file_path}: {e}")
+                results[jzrj_file_path] = False
+        return results
+        
+    def import_from_jzrj(self, jzrj_file_path, password, db_path):
         try:
             # 检查文件是否存在
             if not os.path.exists(jzrj_file_path):
                 print(f"文件不存在: {jzrj_file_path}")
                 return False
                 
-            # 提取原始文件名
-            original_file_name = os.path.splitext(jzrj_file_path)[0]
-            
-            # 检查哈希值文件是否存在
-            hash_file_name = f"{original_file_name}.jzrj.hash"
-            if not os.path.exists(hash_file_name):
-                print(f"哈希值文件不存在: {hash_file_name}")
+            # 分块格式：边解密边写入当前账本
+            if JzrjArchiveReader.is_chunked(jzrj_file_path):
+                archive = self.open_jzrj(jzrj_file_path, password)
+                try:
+                    return self.replace_records(db_path, archive.iter_rows())
+                finally:
+                    archive.close()
+                    
+            # 旧版整体加密的JSON格式
+            expected_hash = self.read_expected_hash(jzrj_file_path)
+            if expected_hash is None:
                 return False
                 
-            # 读取文件Hash值
-            with open(hash_file_name, 'r') as f:
-                expected_hash = f.read().strip()
-                
             # 计算当前文件的哈希值
             with open(jzrj_file_path, 'rb') as f:
                 jzrj_data = f.read()
@@ -404,40 +2465,362 @@ class FileManager:
                 print(f"哈希值不匹配，文件可能被篡改！")
                 return False
                 
-            # 读取加密数据
-            encrypted_data = json.loads(jzrj_data.decode('utf-8'))
+            # 读取加密数据
+            encrypted_data = json.loads(jzrj_data.decode('utf-8'))
+            
+            # 解密数据
+            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data, password, self.load_private_key())
+            if not decrypted_data:
+                return False
+                
+            # 明文只保留在内存中，直接逐行写入当前账本
+            reader = csv.reader(io.StringIO(decrypted_data.decode('utf-8'), newline=''))
+            next(reader)  # 跳过表头
+            return self.replace_records(db_path, reader)
+            
+        except Exception as e:
+            print(f"从.jzrj文件导入时出错: {e}")
+            return False
+
+
+# 增量加密备份管理类
+# 备份目录中的 manifest.json 记录整条备份链：一个完整的基础归档加若干增量归档，
+# 每个归档记录自身摘要与上一个归档的摘要（parent），恢复时逐个校验并顺序回放。
+# 增量归档只包含自上次备份以来 record_changes 中出现过的记录，首列为操作类型：
+# U 表示新增或修改后的完整记录，D 表示已删除的记录ID。
+class BackupManager:
+    MANIFEST_NAME = "manifest.json"
+    DELTA_COLUMNS = ['op'] + RECORD_COLUMNS
+    # 归档的数据块是CSV文本，NULL写成 \N，以反斜杠开头的字符串再加一个反斜杠，恢复后与原账本一致
+    NULL_TEXT = '\\N'
+    
+    def __init__(self, backup_dir, file_manager=None):
+        self.backup_dir = backup_dir
+        self.manifest_path = os.path.join(backup_dir, self.MANIFEST_NAME)
+        self.file_manager = file_manager or FileManager(None)
+        
+    @staticmethod
+    def ensure_change_log(conn):
+        """创建变更日志表及触发器，记录每次增删改涉及的记录ID；第一次备份时才创建，没有备份的账本不记录变更"""
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS record_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id INTEGER,
+                op TEXT
+            );
+            CREATE TRIGGER IF NOT EXISTS records_log_insert AFTER INSERT ON records BEGIN
+                INSERT INTO record_changes (record_id, op) VALUES (NEW.id, 'U');
+            END;
+            CREATE TRIGGER IF NOT EXISTS records_log_update AFTER UPDATE ON records BEGIN
+                INSERT INTO record_changes (record_id, op) SELECT OLD.id, 'D' WHERE OLD.id <> NEW.id;
+                INSERT INTO record_changes (record_id, op) VALUES (NEW.id, 'U');
+            END;
+            CREATE TRIGGER IF NOT EXISTS records_log_delete AFTER DELETE ON records BEGIN
+                INSERT INTO record_changes (record_id, op) VALUES (OLD.id, 'D');
+            END;
+        ''')
+        
+    @staticmethod
+    def current_seq(conn):
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='record_changes'").fetchone()
+        return row[0] if row else 0
+        
+    @staticmethod
+    def prune_change_log(db_path, seq):
+        """删除已经写入备份链的变更；日志序号连续递增，清理后仍能发现缺口"""
+        conn = sqlite3.connect(db_path)
+        try:
+            with conn:
+                conn.execute("DELETE FROM record_changes WHERE seq <= ?", (seq,))
+        finally:
+            conn.close()
+            
+    @classmethod
+    def encode_row(cls, row):
+        return [cls.NULL_TEXT if value is None else
+                '\\' + value if isinstance(value, str) and value.startswith('\\') else value
+                for value in row]
+        
+    @classmethod
+    def decode_row(cls, row):
+        return [None if value == cls.NULL_TEXT else value[1:] if value.startswith('\\') else value
+                for value in row]
+        
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'format': 'jzrj-manifest', 'version': 1, 'last_seq': 0, 'archives': []}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+            
+    def save_manifest(self, manifest):
+        # 先写临时文件再替换，避免中途失败留下损坏的清单
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        
+    def verify_chain(self, manifest):
+        """检查备份链的父指针是否首尾相接"""
+        archives = manifest['archives']
+        if not archives:
+            raise ValueError("备份链为空")
+        parent = None
+        for entry in archives:
+            expected_kind = 'base' if parent is None else 'delta'
+            if entry['kind'] != expected_kind or entry['parent'] != parent:
+                raise ValueError(f"备份链在 {entry['file']} 处断开")
+            parent = entry['sha256']
+        return archives
+        
+    def _write_archive(self, manifest, kind, seq, password, batches, codec, level):
+        archive_no = len(manifest['archives']) + 1
+        file_name = f"{kind}_{archive_no:04d}.jzrj"
+        if manifest.get('generation'):
+            # 合并后的新链使用新的代号，避免与旧链中的同名文件冲突
+            file_name = f"g{manifest['generation']}_{file_name}"
+        columns = RECORD_COLUMNS if kind == 'base' else self.DELTA_COLUMNS
+        parent = manifest['archives'][-1]['sha256'] if manifest['archives'] else None
+        
+        counter = {'rows': 0}
+        
+        def counted(batches):
+            for rows in batches:
+                counter['rows'] += len(rows)
+                yield [self.encode_row(row) for row in rows]
+                
+        digest = self.file_manager.write_jzrj(
+            os.path.join(self.backup_dir, file_name), password, counted(batches), columns,
+            codec, level, extra_header={'kind': kind, 'seq': seq, 'parent': parent}
+        )
+        manifest['archives'].append({
+            'file': file_name,
+            'kind': kind,
+            'seq': seq,
+            'rows': counter['rows'],
+            'sha256': digest,
+            'parent': parent,
+            'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        })
+        manifest['last_seq'] = seq
+        return manifest['archives'][-1]
+        
+    def _delta_batches(self, conn, since_seq, until_seq):
+        # 同一记录多次变更时只取最后一次，已删除的记录只保留ID
+        cursor = conn.execute('''
+            SELECT c.op, c.record_id, r.date, r.amount, r.currency, r.type, r.category, r.note
+            FROM (
+                SELECT record_id, op, MAX(seq) FROM record_changes
+                WHERE seq > ? AND seq <= ? GROUP BY record_id
+            ) c LEFT JOIN records r ON r.id = c.record_id
+        ''', (since_seq, until_seq))
+        for rows in fetch_batches(cursor):
+            yield [row if row[0] == 'U' else ('D', row[1], None, None, None, None, None, None) for row in rows]
+            
+    def backup(self, db_path, password, codec=JZRJ_DEFAULT_CODEC, level=JZRJ_DEFAULT_LEVEL):
+        """备份链为空时写入完整归档，否则只写入上次备份以来的变更，返回新归档的清单条目"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        if manifest['archives']:
+            # 增量归档必须与备份链使用同一个密码，否则整条链都无法恢复
+            self.check_password(manifest['archives'][-1:], password)
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            self.ensure_change_log(conn)
+            conn.commit()
+            # 在同一读事务中取序号和数据，保证快照一致
+            conn.execute("BEGIN")
+            seq = self.current_seq(conn)
+            if not manifest['archives']:
+                entry = self._write_archive(manifest, 'base', seq, password,
+                                            fetch_batches(conn.execute("SELECT * FROM records")), codec, level)
+            else:
+                first_seq = conn.execute("SELECT MIN(seq) FROM record_changes").fetchone()[0]
+                if seq < manifest['last_seq']:
+                    raise ValueError("当前账本与备份链不匹配，请在新目录中创建完整备份")
+                if seq > manifest['last_seq'] and (first_seq is None or first_seq > manifest['last_seq'] + 1):
+                    raise ValueError("上次备份以来的变更已被其他备份链清理，请在新目录中创建完整备份")
+                entry = self._write_archive(manifest, 'delta', seq, password,
+                                            self._delta_batches(conn, manifest['last_seq'], seq), codec, level)
+            conn.rollback()
+        finally:
+            conn.close()
             
-            # 从文件中加载私钥
-            if self.private_key is None:
-                with open("private_key.pem", "rb") as key_file:
-                    self.private_key = serialization.load_pem_private_key(
-                        key_file.read(),
-                        password=None,
-                        backend=default_backend()
+        self.save_manifest(manifest)
+        self.prune_change_log(db_path, seq)
+        return entry
+        
+    def check_password(self, archives, password):
+        """回放前先校验整条链的密码，同一批写入的归档共用派生结果"""
+        kek_cache = {}
+        for entry in archives:
+            path = os.path.join(self.backup_dir, entry['file'])
+            if not self.file_manager.check_jzrj_password(path, password, kek_cache):
+                raise ValueError(f"密码错误: {entry['file']}")
+        return kek_cache
+        
+    def _replay(self, conn, archives, password, kek_cache=None):
+        """按顺序流式回放备份链到给定连接（调用方负责事务）"""
+        conn.execute("DELETE FROM records")
+        for entry in archives:
+            archive = self.file_manager.open_jzrj(
+                os.path.join(self.backup_dir, entry['file']), password, entry['sha256'], kek_cache
+            )
+            try:
+                for rows in archive.iter_chunks():
+                    rows = [self.decode_row(row) for row in rows]
+                    if entry['kind'] == 'base':
+                        conn.executemany(
+                            "INSERT INTO records (id, date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?,?)",
+                            rows
+                        )
+                        continue
+                    conn.executemany("DELETE FROM records WHERE id=?", [(row[1],) for row in rows if row[0] == 'D'])
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO records (id, date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?,?)",
+                        [row[1:] for row in rows if row[0] == 'U']
                     )
-                    
-            # 解密数据
-            decrypted_data = self.encryption_manager.decrypt_data(encrypted_data, password, self.private_key)
-            if not decrypted_data:
-                return False
-                
-            # 将解密后的数据写入CSV文件
-            csv_file_name = f"{original_file_name}.csv"
-            with open(csv_file_name, 'w', encoding='utf-8') as f:
-                f.write(decrypted_data.decode('utf-8'))
-                
-            # 导入CSV文件到数据库
-            db_path = 'accounting.db'
-            if not self.import_from_csv(db_path, csv_file_name):
-                return False
+            finally:
+                archive.close()
                 
-            # 删除临时CSV文件
-            os.remove(csv_file_name)
-            return True
+    def restore(self, db_path, password):
+        """用备份链覆盖账本，整个过程在一个事务中完成"""
+        manifest = self.load_manifest()
+        archives = self.verify_chain(manifest)
+        kek_cache = self.check_password(archives, password)
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            self.ensure_change_log(conn)
+            with conn:
+                self._replay(conn, archives, password, kek_cache)
+                # 账本已与备份链末端一致，重置变更日志使后续增量从 last_seq 继续
+                conn.execute("DELETE FROM record_changes")
+                conn.execute("DELETE FROM sqlite_sequence WHERE name='record_changes'")
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('record_changes', ?)",
+                             (manifest['last_seq'],))
+        finally:
+            conn.close()
+        return True
+        
+    def compact(self, password, codec=JZRJ_DEFAULT_CODEC, level=JZRJ_DEFAULT_LEVEL, db_path=None):
+        """把整条备份链合并成新的完整归档，不改动当前账本的记录；给出 db_path 时清理已备份的变更日志"""
+        manifest = self.load_manifest()
+        archives = self.verify_chain(manifest)
+        kek_cache = self.check_password(archives, password)
+        
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute(RECORDS_TABLE_SQL)
+            self._replay(conn, archives, password, kek_cache)
+            
+            compacted = {'format': 'jzrj-manifest', 'version': 1, 'last_seq': 0,
+                         'archives': [], 'generation': manifest.get('generation', 0) + 1}
+            self._write_archive(compacted, 'base', manifest['last_seq'], password,
+                                fetch_batches(conn.execute("SELECT * FROM records ORDER BY id")), codec, level)
+        finally:
+            conn.close()
             
+        self.save_manifest(compacted)
+        if db_path is not None:
+            self.prune_change_log(db_path, compacted['last_seq'])
+        for entry in archives:
+            for path in (entry['file'], entry['file'] + ".hash"):
+                path = os.path.join(self.backup_dir, path)
+                if os.path.exists(path):
+                    os.remove(path)
+        return compacted['archives'][0]
+
+
+# 加密归档只读表格模型，只有视图请求的行才会触发所在块的解密
+class JzrjArchiveTableModel(QAbstractTableModel):
+    HEADERS = ["日期", "金额", "币种", "收支类型", "详细分类", "备注信息"]
+    
+    def __init__(self, archive, parent=None):
+        super().__init__(parent)
+        self.archive = archive
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.archive.row_count
+        
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        try:
+            # 第0列是记录ID，不显示
+            return self.archive.row(index.row())[index.column() + 1]
         except Exception as e:
-            print(f"从.jzrj文件导入时出错: {e}")
+            print(f"读取归档数据块时出错: {e}")
+            return ""
+            
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+
+# 批量文本记账的预览表：第一列勾选是否添加，推断出来的字段用橙色显示，没有金额的行默认不勾选
+class BulkRecordTableModel(QAbstractTableModel):
+    HEADERS = ["行", "日期", "金额", "币种", "收支类型", "详细分类", "备注信息"]
+    FIELDS = ('date', 'amount', 'currency', 'type', 'category', 'note')
+    GUESSED_COLOR = QColor("#d9822b")
+    
+    def __init__(self, results=(), parent=None):
+        super().__init__(parent)
+        self.results = list(results)
+        self.checked = [record.amount > 0 for _, record in self.results]
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+        
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+        
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        number, record = self.results[index.row()]
+        column = index.column()
+        if column == 0:
+            if role == Qt.DisplayRole:
+                return str(number)
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.checked[index.row()] else Qt.Unchecked
+            return None
+        field = self.FIELDS[column - 1]
+        if role == Qt.DisplayRole:
+            return str(getattr(record, field))
+        if role == Qt.ForegroundRole and record.confidence.get(field, 1.0) < 1.0:
+            return self.GUESSED_COLOR
+        return None
+        
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 0 or role != Qt.CheckStateRole:
             return False
+        self.checked[index.row()] = Qt.CheckState(value) == Qt.Checked
+        self.dataChanged.emit(index, index, [role])
+        return True
+        
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+        
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+        
+    def checked_rows(self):
+        return [record.values() for (_, record), checked in zip(self.results, self.checked) if checked]
 
 
 # 自定义对话框基类，确保所有对话框符合主题
@@ -484,11 +2867,13 @@ class ThemedDialog(QDialog):
 
 # 录音对话框
 class RecordDialog(ThemedDialog):
+    STAGING_COLUMNS = ["日期", "金额", "币种", "类型", "分类", "备注"]
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_app = parent
         self.setWindowTitle("录音")
-        self.setFixedSize(300, 180)
+        self.setFixedSize(420, 470)
         
         layout = QVBoxLayout(self)
         
@@ -506,9 +2891,49 @@ class RecordDialog(ThemedDialog):
         button_layout.addWidget(self.start_btn)
         button_layout.addWidget(self.stop_btn)
         
+        # 语音引擎预热状态
+        self.engine_label = QLabel("", alignment=Qt.AlignCenter)
+        self.engine_label.setStyleSheet("font-size: 12px; color: #666;")
+        
+        # 受限识别：只在记账相关词汇中解码，录音过程中也可以切换
+        self.grammar_checkbox = QCheckBox("限定记账词汇")
+        self.grammar_checkbox.setToolTip("只识别数字、币种、分类、日期和常用备注，识别更快更准；说其他内容时请关闭")
+        self.grammar_checkbox.toggled.connect(self.toggle_grammar)
+        
+        # 连续记账：每句话生成一条待提交记录，最后一次性提交
+        self.session_checkbox = QCheckBox("连续记账")
+        self.session_checkbox.setToolTip("每说完一句生成一条记录，核对后一次性全部提交")
+        self.session_checkbox.toggled.connect(self.toggle_session_mode)
+        
+        # 调试用：显示语音记账各阶段耗时
+        self.timings_checkbox = QCheckBox("显示耗时")
+        self.timings_checkbox.toggled.connect(self.toggle_timings_overlay)
+        
+        option_layout = QHBoxLayout()
+        option_layout.addStretch()
+        option_layout.addWidget(self.grammar_checkbox)
+        option_layout.addWidget(self.session_checkbox)
+        option_layout.addWidget(self.timings_checkbox)
+        option_layout.addStretch()
+        
         layout.addWidget(self.status_label)
         layout.addWidget(self.time_label)
+        layout.addWidget(self.engine_label)
+        layout.addLayout(option_layout)
         layout.addLayout(button_layout)
+        layout.addWidget(self.create_preview_group())
+        layout.addWidget(self.create_staging_group())
+        
+        self.timings_label = QLabel("")
+        self.timings_label.setStyleSheet("font-family: monospace; font-size: 11px; color: #444;")
+        self.timings_label.setVisible(False)
+        layout.addWidget(self.timings_label)
+        self.timings_timer = QTimer(self)
+        self.timings_timer.timeout.connect(self.update_timings_overlay)
+        
+        self.batch_btn = QPushButton("批量转写录音文件...")
+        self.batch_btn.clicked.connect(self.show_batch_dialog)
+        layout.addWidget(self.batch_btn)
         
         # 绑定录音逻辑
         self.start_btn.clicked.connect(self.start_recording)
@@ -517,31 +2942,294 @@ class RecordDialog(ThemedDialog):
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_time)
         self.elapsed_time = 0
+        # 识别线程结束前为当前线程；关闭对话框时线程还在运行，先记下 done 的结果，线程结束后再关闭
         self.voice_thread = None
+        self.closing_result = None
+        # 已确定的识别文本（尚未添加到账本），以及上一次提取过的文本和结果
+        self.final_text = ""
+        self.pending_record = None
+        self.preview_cache = ("", None)
+        
+        # 打开对话框时就在后台加载模型，已加载过则不会重复加载
+        voice_models.preload(resource_path(VOICE_MODEL_PATH))
+        
+        self.warmup = getattr(parent, "engine_warmup", None)
+        if self.warmup is not None:
+            self.warmup.status_changed.connect(self.update_engine_status)
+            self.update_engine_status()
+            
+    def create_preview_group(self):
+        """识别预览：边说边显示识别文本和提取出的记录字段"""
+        group = QGroupBox("识别预览")
+        group_layout = QVBoxLayout(group)
+        
+        self.preview_text = QLabel("")
+        self.preview_text.setWordWrap(True)
+        self.preview_text.setStyleSheet("font-size: 13px; color: #2d3949;")
+        group_layout.addWidget(self.preview_text)
+        
+        self.preview_fields = {}
+        for key, title in (('date', "日期"), ('amount', "金额"), ('currency', "币种"), ('type', "类型"), ('category', "分类")):
+            row = QHBoxLayout()
+            row.addWidget(QLabel(f"{title}:"))
+            value_label = QLabel("-")
+            value_label.setStyleSheet("font-size: 13px; font-weight: bold;")
+            row.addWidget(value_label)
+            row.addStretch()
+            group_layout.addLayout(row)
+            self.preview_fields[key] = value_label
+            
+        confirm_layout = QHBoxLayout()
+        self.confirm_btn = QPushButton("确认添加")
+        self.confirm_btn.setEnabled(False)
+        self.confirm_btn.clicked.connect(self.confirm_record)
+        self.discard_btn = QPushButton("放弃")
+        self.discard_btn.setEnabled(False)
+        self.discard_btn.clicked.connect(self.discard_record)
+        confirm_layout.addStretch()
+        confirm_layout.addWidget(self.confirm_btn)
+        confirm_layout.addWidget(self.discard_btn)
+        group_layout.addLayout(confirm_layout)
+        return group
+        
+    def create_staging_group(self):
+        """连续记账的待提交列表，可以直接修改单元格或删除识别错的记录"""
+        self.staging_group = QGroupBox("待提交记录")
+        group_layout = QVBoxLayout(self.staging_group)
+        
+        self.staging_table = QTableWidget(0, len(self.STAGING_COLUMNS))
+        self.staging_table.setHorizontalHeaderLabels(self.STAGING_COLUMNS)
+        self.staging_table.horizontalHeader().setSectionResizeMode(5, QHeaderView.Stretch)
+        group_layout.addWidget(self.staging_table)
+        
+        staging_buttons = QHBoxLayout()
+        self.remove_staged_btn = QPushButton("删除所选")
+        self.remove_staged_btn.clicked.connect(self.remove_staged_records)
+        self.commit_btn = QPushButton("全部提交")
+        self.commit_btn.clicked.connect(self.commit_staged_records)
+        staging_buttons.addStretch()
+        staging_buttons.addWidget(self.remove_staged_btn)
+        staging_buttons.addWidget(self.commit_btn)
+        group_layout.addLayout(staging_buttons)
+        
+        self.staging_group.setVisible(False)
+        return self.staging_group
+        
+    def toggle_session_mode(self, enabled):
+        self.staging_group.setVisible(enabled)
+        self.update_dialog_size()
+        
+    def toggle_timings_overlay(self, enabled):
+        self.timings_label.setVisible(enabled)
+        if enabled:
+            self.update_timings_overlay()
+            self.timings_timer.start(500)
+        else:
+            self.timings_timer.stop()
+        self.update_dialog_size()
+        
+    def update_dialog_size(self):
+        width = 600 if self.session_checkbox.isChecked() else 420
+        height = 470
+        if self.session_checkbox.isChecked():
+            height += 290
+        if self.timings_checkbox.isChecked():
+            height += 200
+        self.setFixedSize(width, height)
+        
+    def update_timings_overlay(self):
+        def ms(value):
+            return f"{value * 1000:8.1f}" if value is not None else "       -"
+        # 中文标题每个字占两列宽度
+        lines = [f"{'阶段':<16}{'最近':>6}{'p50':>8}{'p95':>8}{'次数':>4}  (ms)"]
+        for stage, item in sorted(voice_timings.summary().items()):
+            lines.append(f"{stage:<18}{ms(item['last'])}{ms(item['p50'])}{ms(item['p95'])}{item['count']:>6}")
+        self.timings_label.setText("\n".join(lines))
+            
+    def stage_record(self, record):
+        row = self.staging_table.rowCount()
+        self.staging_table.insertRow(row)
+        for column, value in enumerate(record):
+            self.staging_table.setItem(row, column, QTableWidgetItem(str(value)))
+        self.staging_table.scrollToBottom()
+        self.status_label.setText(f"正在录音...（已记 {row + 1} 条）")
+        
+    def staged_records(self):
+        """读取待提交列表，金额无法转换为数字时抛出 ValueError"""
+        records = []
+        for row in range(self.staging_table.rowCount()):
+            values = [self.staging_table.item(row, column).text() for column in range(len(self.STAGING_COLUMNS))]
+            try:
+                values[1] = float(values[1])
+            except ValueError:
+                raise ValueError(f"第 {row + 1} 行的金额无效: {values[1]}")
+            records.append(tuple(values))
+        return records
+        
+    def remove_staged_records(self):
+        rows = sorted({index.row() for index in self.staging_table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.staging_table.removeRow(row)
+            
+    def commit_staged_records(self):
+        if self.staging_table.rowCount() == 0:
+            return True
+        try:
+            count = self.parent_app.add_records(self.staged_records(), timings=voice_timings)
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "提交失败", str(e))
+            return False
+        self.staging_table.setRowCount(0)
+        self.status_label.setText(f"已提交 {count} 条记录")
+        return True
+        
+    def done(self, result):
+        if self.voice_thread is not None:
+            # 识别线程还在处理剩余音频，等它结束后再关闭，最后一句的识别结果不会丢失
+            self.closing_result = result
+            self.stop_recording()
+            return
+        # 关闭对话框时还有未提交的记录，询问是否提交
+        if self.staging_table.rowCount() > 0:
+            reply = QMessageBox.question(self, "未提交的记录",
+                                         f"还有 {self.staging_table.rowCount()} 条记录未提交，是否现在提交？",
+                                         QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes and not self.commit_staged_records():
+                return
+        # 识别出但还没确认的记录同样询问，不静默丢弃
+        if self.pending_record is not None:
+            reply = QMessageBox.question(self, "未添加的记录",
+                                         f"识别结果“{self.final_text}”还没有添加到账本，是否现在添加？",
+                                         QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes:
+                self.confirm_record()
+        self.timings_timer.stop()
+        voice_timings.finish_session()
+        super().done(result)
+        
+    def preview_record(self, text):
+        """提取并显示记录字段；文本与上一次相同时直接复用上次的结果"""
+        if text != self.preview_cache[0]:
+            self.preview_cache = (text, self.parent_app.extract_record(text) if text else None)
+        record = self.preview_cache[1]
+        self.preview_text.setText(text)
+        values = record[:5] if record else ("-",) * 5
+        for label, value in zip(self.preview_fields.values(), values):
+            label.setText(str(value))
+        return record
+        
+    def handle_partial_text(self, partial):
+        # 中间结果接在已确定的文本之后显示
+        self.preview_record(f"{self.final_text} {partial}".strip())
+        
+    def handle_final_text(self, text):
+        if not text:
+            if not self.final_text:
+                self.status_label.setText("未识别到有效内容")
+            return
+        if self.session_checkbox.isChecked():
+            # 连续记账时每句话单独成为一条记录，加入待提交列表
+            self.stage_record(self.preview_record(text))
+            return
+        # 停顿切分出的多句话合并为同一条记录，直到用户确认
+        self.final_text = f"{self.final_text} {text}".strip()
+        self.pending_record = self.preview_record(self.final_text)
+        self.confirm_btn.setEnabled(True)
+        self.discard_btn.setEnabled(True)
+        
+    def confirm_record(self):
+        if self.pending_record is None:
+            return
+        self.parent_app.add_record(*self.pending_record, timings=voice_timings)
+        self.status_label.setText("已添加记录")
+        self.clear_preview()
+        
+    def discard_record(self):
+        self.clear_preview()
+        
+    def clear_preview(self):
+        self.final_text = ""
+        self.pending_record = None
+        self.preview_record("")
+        self.confirm_btn.setEnabled(False)
+        self.discard_btn.setEnabled(False)
+        
+    def update_engine_status(self):
+        self.engine_label.setText(self.warmup.status_text())
+        if not self.warmup.is_ready():
+            # 预热未完成时也可以开始录音，音频会先缓存
+            self.status_label.setText("准备录音...（引擎预热中）")
+        elif self.status_label.text().startswith("准备录音"):
+            self.status_label.setText("准备录音...")
 
     def start_recording(self):
         # 调用录音逻辑
-        model_path = resource_path("resources/vosk-model-small-cn-0.22")
-        self.voice_thread = VoiceRecognition(model_path, 20)
-        self.voice_thread.recognized_text.connect(self.parent_app.process_voice_input)
+        model_path = resource_path(VOICE_MODEL_PATH)
+        if self.session_checkbox.isChecked():
+            # 连续记账一次说多笔，句间停顿不能结束录音，也不设时长上限，只在用户点击停止时结束
+            self.voice_thread = VoiceRecognition(model_path, None, grammar=self.current_grammar(),
+                                                 auto_stop=False)
+        else:
+            self.voice_thread = VoiceRecognition(model_path, 20, grammar=self.current_grammar())
+        # 线程归主窗口所有并在结束后删除，对话框先关闭也不会销毁仍在运行的线程
+        self.voice_thread.setParent(self.parent_app)
+        self.voice_thread.recognized_text.connect(self.handle_final_text)
+        self.voice_thread.partial_text.connect(self.handle_partial_text)
         self.voice_thread.recording_stopped.connect(self.handle_recording_stopped)
+        self.voice_thread.finished.connect(self.handle_thread_finished)
+        self.voice_thread.finished.connect(self.voice_thread.deleteLater)
         self.voice_thread.start()
         
         self.status_label.setText("正在录音...")
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
+        self.session_checkbox.setEnabled(False)
         self.elapsed_time = 0
         self.timer.start(1000)
         
+    def show_batch_dialog(self):
+        dialog = BatchTranscribeDialog(self.parent_app)
+        dialog.exec()
+        
+    def current_grammar(self):
+        if not self.grammar_checkbox.isChecked():
+            return None
+        return self.parent_app.voice_grammar()
+        
+    def toggle_grammar(self):
+        if self.voice_thread is not None:
+            self.voice_thread.set_grammar(self.current_grammar())
+            
     def stop_recording(self):
-        # 停止录音
-        if self.voice_thread and self.voice_thread.isRunning():
+        # 只请求停止，不在界面线程中等待；剩余音频识别完成后通过 recording_stopped 更新界面
+        if self.voice_thread is not None:
             self.voice_thread.stop_recording()
+        if self.stop_btn.isEnabled():
+            self.stop_btn.setEnabled(False)
+            backlog = self.voice_thread.capture_stats()['queue_seconds'] if self.voice_thread is not None else 0
+            self.status_label.setText(f"正在识别剩余的 {backlog:.1f} 秒音频..." if backlog else "正在停止录音...")
+            
+    def handle_thread_finished(self):
+        if self.sender() is self.voice_thread:
+            self.voice_thread = None
+        if self.closing_result is not None and self.voice_thread is None:
+            result, self.closing_result = self.closing_result, None
+            self.done(result)
         
     def handle_recording_stopped(self):
-        self.status_label.setText("录音已停止")
+        if self.session_checkbox.isChecked():
+            self.status_label.setText(f"录音已停止，{self.staging_table.rowCount()} 条记录待提交")
+        elif self.pending_record is not None:
+            self.status_label.setText("录音已停止，请确认识别结果")
+        else:
+            self.status_label.setText("录音已停止，未识别到有效内容")
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
+        self.session_checkbox.setEnabled(True)
         self.timer.stop()
         
     def update_time(self):
@@ -551,6 +3239,246 @@ class RecordDialog(ThemedDialog):
         self.time_label.setText(f"{minutes:02d}:{seconds:02d}")
 
 
+# 批量转写对话框：选择录音文件目录，转写后一次性写入账本并显示每个文件的结果
+class BatchTranscribeDialog(ThemedDialog):
+    REPORT_COLUMNS = ["文件", "状态", "识别内容", "日期", "金额", "分类", "耗时(秒)"]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_app = parent
+        self.setWindowTitle("批量转写")
+        self.resize(760, 460)
+        self.worker = None
+        self.results = []
+        
+        layout = QVBoxLayout(self)
+        
+        dir_layout = QHBoxLayout()
+        self.dir_input = QLineEdit()
+        self.dir_input.setPlaceholderText("包含WAV录音文件的目录")
+        browse_btn = QPushButton("浏览...")
+        browse_btn.clicked.connect(self.choose_directory)
+        dir_layout.addWidget(self.dir_input)
+        dir_layout.addWidget(browse_btn)
+        
+        option_layout = QHBoxLayout()
+        self.grammar_checkbox = QCheckBox("限定记账词汇")
+        self.workers_combobox = QComboBox()
+        cpu_count = os.cpu_count() or 1
+        self.workers_combobox.addItems([str(n) for n in range(1, cpu_count + 1)])
+        self.workers_combobox.setCurrentText(str(cpu_count))
+        option_layout.addWidget(self.grammar_checkbox)
+        option_layout.addStretch()
+        option_layout.addWidget(QLabel("进程数:"))
+        option_layout.addWidget(self.workers_combobox)
+        
+        self.status_label = QLabel("")
+        
+        self.report_table = QTableWidget(0, len(self.REPORT_COLUMNS))
+        self.report_table.setHorizontalHeaderLabels(self.REPORT_COLUMNS)
+        self.report_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.report_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        button_layout = QHBoxLayout()
+        self.start_btn = QPushButton("开始转写")
+        self.start_btn.clicked.connect(self.start_transcription)
+        self.export_btn = QPushButton("导出报告")
+        self.export_btn.setEnabled(False)
+        self.export_btn.clicked.connect(self.export_report)
+        button_layout.addStretch()
+        button_layout.addWidget(self.start_btn)
+        button_layout.addWidget(self.export_btn)
+        
+        layout.addLayout(dir_layout)
+        layout.addLayout(option_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.report_table)
+        layout.addLayout(button_layout)
+        
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择录音文件目录")
+        if directory:
+            self.dir_input.setText(directory)
+            
+    def start_transcription(self):
+        directory = self.dir_input.text().strip()
+        if not os.path.isdir(directory):
+            QMessageBox.warning(self, "错误", "请选择有效的目录！")
+            return
+        files = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith('.wav'))
+        if not files:
+            QMessageBox.warning(self, "错误", "目录中没有WAV文件！")
+            return
+            
+        grammar = self.parent_app.voice_grammar() if self.grammar_checkbox.isChecked() else None
+        self.worker = BatchTranscription(files, resource_path(VOICE_MODEL_PATH), grammar,
+                                         int(self.workers_combobox.currentText()))
+        self.worker.progress.connect(self.update_progress)
+        self.worker.transcribed.connect(self.handle_transcribed)
+        self.worker.start()
+        
+        self.start_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.report_table.setRowCount(0)
+        self.status_label.setText(f"正在转写 {len(files)} 个文件...")
+        
+    def update_progress(self, done, total):
+        self.status_label.setText(f"正在转写: {done}/{total}")
+        
+    def handle_transcribed(self, results):
+        self.results = results
+        added = self.parent_app.import_transcripts(results)
+        
+        self.report_table.setRowCount(len(results))
+        for row, result in enumerate(results):
+            record = result.get('record')
+            if result['error']:
+                status = f"失败: {result['error']}"
+            elif record is None:
+                status = "未识别到内容"
+            else:
+                status = "已添加"
+            values = [
+                os.path.basename(result['file']),
+                status,
+                result['text'],
+                record[0] if record else "",
+                str(record[1]) if record else "",
+                record[4] if record else "",
+                f"{result['seconds']:.2f}"
+            ]
+            for column, value in enumerate(values):
+                self.report_table.setItem(row, column, QTableWidgetItem(value))
+                
+        audio_seconds = sum(result['audio_seconds'] for result in results)
+        elapsed = self.worker.elapsed
+        speed_text = f"，{audio_seconds / elapsed:.1f} 倍实时" if elapsed else ""
+        self.status_label.setText(f"完成: {len(results)} 个文件，添加 {added} 条记录，"
+                                  f"音频 {audio_seconds:.1f} 秒，用时 {elapsed:.1f} 秒{speed_text}")
+        self.start_btn.setEnabled(True)
+        self.export_btn.setEnabled(True)
+        
+    def export_report(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出报告", "transcription_report.csv", "CSV 文件 (*.csv)")
+        if not file_path:
+            return
+        with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.REPORT_COLUMNS)
+            for row in range(self.report_table.rowCount()):
+                writer.writerow([self.report_table.item(row, column).text() for column in range(len(self.REPORT_COLUMNS))])
+        QMessageBox.information(self, "导出报告", f"报告已保存到: {file_path}")
+        
+    def done(self, result):
+        # 转写进行中关闭对话框时等待进程池结束，避免线程被提前销毁
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.wait()
+        super().done(result)
+
+
+# 批量文本记账对话框：粘贴多行文本或打开文本文件（例如聊天记录导出），每行一条记录，
+# 预览确认后在一个事务中全部写入
+class BulkTextDialog(ThemedDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_app = parent
+        self.setWindowTitle("批量文本记账")
+        self.resize(860, 620)
+        self.parse_seconds = 0.0
+        
+        layout = QVBoxLayout(self)
+        
+        self.text_edit = QTextEdit()
+        self.text_edit.setAcceptRichText(False)
+        self.text_edit.setPlaceholderText("每行一条记录，例如：\n昨天 午饭 三十五块\n2025-03-05 工资 8000元 收入")
+        
+        input_btn_layout = QHBoxLayout()
+        open_btn = QPushButton("打开文本文件...")
+        open_btn.clicked.connect(self.open_text_file)
+        parse_btn = QPushButton("解析")
+        parse_btn.clicked.connect(self.parse_text)
+        input_btn_layout.addWidget(open_btn)
+        input_btn_layout.addStretch()
+        input_btn_layout.addWidget(parse_btn)
+        
+        self.status_label = QLabel("")
+        
+        self.preview_model = BulkRecordTableModel(parent=self)
+        self.preview_table = QTableView()
+        self.preview_table.setModel(self.preview_model)
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.preview_table.horizontalHeader().setStretchLastSection(True)
+        self.preview_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.preview_table.verticalHeader().hide()
+        
+        button_layout = QHBoxLayout()
+        self.add_btn = QPushButton("添加勾选的记录")
+        self.add_btn.setEnabled(False)
+        self.add_btn.clicked.connect(self.add_records)
+        cancel_btn = QPushButton("取消")
+        cancel_btn.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(self.add_btn)
+        button_layout.addWidget(cancel_btn)
+        
+        layout.addWidget(self.text_edit, 2)
+        layout.addLayout(input_btn_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.preview_table, 3)
+        layout.addLayout(button_layout)
+        
+    def open_text_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "打开文本文件", "", "文本文件 (*.txt);;所有文件 (*)")
+        if not file_path:
+            return
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        # 聊天记录导出多为UTF-8，Windows下保存的文本可能是GBK
+        for encoding in ('utf-8-sig', 'gb18030'):
+            try:
+                text = data.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            QMessageBox.warning(self, "错误", "无法识别文件编码！")
+            return
+        self.text_edit.setPlainText(text)
+        self.parse_text()
+        
+    def parse_text(self):
+        lines = self.text_edit.toPlainText().splitlines()
+        start = time.perf_counter()
+        results = self.parent_app.extractor.extract_lines(lines)
+        elapsed = time.perf_counter() - start
+        
+        self.preview_model = BulkRecordTableModel(results, self)
+        self.preview_model.dataChanged.connect(self.update_status)
+        self.preview_table.setModel(self.preview_model)
+        self.add_btn.setEnabled(bool(results))
+        self.parse_seconds = elapsed
+        self.update_status()
+        
+    def update_status(self):
+        results = self.preview_model.results
+        checked = sum(self.preview_model.checked)
+        self.status_label.setText(f"解析 {len(results)} 行，用时 {self.parse_seconds * 1000:.0f} 毫秒，"
+                                  f"勾选 {checked} 条（橙色字段为推断值，没有金额的行默认不勾选）")
+        
+    def add_records(self):
+        rows = self.preview_model.checked_rows()
+        if not rows:
+            QMessageBox.warning(self, "错误", "没有勾选任何记录！")
+            return
+        try:
+            added = self.parent_app.add_records(rows)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "错误", f"添加记录失败，已全部回滚: {e}")
+            return
+        QMessageBox.information(self, "批量文本记账", f"已添加 {added} 条记录")
+        self.accept()
+
+
 # 添加记录对话框
 class AddRecordDialog(ThemedDialog):
     def __init__(self, parent=None, is_modify=False, record_id=None):
@@ -590,7 +3518,8 @@ class AddRecordDialog(ThemedDialog):
         currency_layout = QHBoxLayout()
         currency_label = QLabel("币种:")
         self.currency_combobox = QComboBox()
-        self.currency_combobox.addItems(["人民币 (CNY)", "美元 (USD)", "欧元 (EUR)", "日元 (JPY)", "其他"])
+        currencies = list(CURRENCY_MAP.values()) + self.parent_app.ledger_rules.currencies() + ["其他"]
+        self.currency_combobox.addItems(list(dict.fromkeys(currencies)))
         currency_layout.addWidget(currency_label)
         currency_layout.addWidget(self.currency_combobox)
         
@@ -604,9 +3533,8 @@ class AddRecordDialog(ThemedDialog):
         category_layout = QHBoxLayout()
         category_label = QLabel("详细分类:")
         self.category_combobox = QComboBox()
-        income_categories = ["工资收入", "奖金收入", "投资收益", "兼职收入"]
-        expense_categories = ["餐饮", "购物", "交通", "住房", "娱乐", "医疗"]
-        self.category_combobox.addItems(income_categories + expense_categories)
+        categories = INCOME_CATEGORIES + EXPENSE_CATEGORIES + self.parent_app.ledger_rules.categories()
+        self.category_combobox.addItems(list(dict.fromkeys(categories)))
         category_layout.addWidget(category_label)
         category_layout.addWidget(self.category_combobox)
         
@@ -695,6 +3623,8 @@ class AddRecordDialog(ThemedDialog):
 
 # 设置对话框
 class SettingsDialog(ThemedDialog):
+    RULE_COLUMNS = ["关键词", "分类", "收支类型", "币种", "优先级"]
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_app = parent
@@ -740,7 +3670,7 @@ class SettingsDialog(ThemedDialog):
             }
         """)
         
-        menu_items = ["用户协议", "文件管理", "文件加密", "快捷键", "关于"]
+        menu_items = ["用户协议", "文件管理", "文件加密", "记账规则", "快捷键", "关于"]
         for item in menu_items:
             list_item = QListWidgetItem(item)
             list_item.setTextAlignment(Qt.AlignCenter)
@@ -768,6 +3698,7 @@ class SettingsDialog(ThemedDialog):
         self.add_menu_page("用户协议", self.create_user_agreement_page())
         self.add_menu_page("文件管理", self.create_file_management_page())
         self.add_menu_page("文件加密", self.create_file_encryption_page())
+        self.add_menu_page("记账规则", self.create_rules_page())
         self.add_menu_page("快捷键", self.create_shortcuts_page())
         self.add_menu_page("关于", self.create_about_page())
         
@@ -967,6 +3898,20 @@ class SettingsDialog(ThemedDialog):
         self.encrypt_button.clicked.connect(self.encrypt_and_export)
         encryption_layout.addWidget(self.encrypt_button)
         
+        # 压缩方式与压缩级别
+        compression_layout = QHBoxLayout()
+        compression_layout.addWidget(QLabel("压缩方式:"))
+        self.codec_combobox = QComboBox()
+        self.codec_combobox.addItems(jzrj_codecs())
+        self.codec_combobox.setCurrentText(JZRJ_DEFAULT_CODEC)
+        compression_layout.addWidget(self.codec_combobox)
+        compression_layout.addWidget(QLabel("压缩级别:"))
+        self.level_combobox = QComboBox()
+        self.level_combobox.addItems([str(level) for level in range(1, 10)])
+        self.level_combobox.setCurrentText(str(JZRJ_DEFAULT_LEVEL))
+        compression_layout.addWidget(self.level_combobox)
+        encryption_layout.addLayout(compression_layout)
+        
         # 解密导入按钮
         self.decrypt_button = QPushButton("从.jzrj文件解密导入")
         self.decrypt_button.setStyleSheet("""
@@ -991,11 +3936,165 @@ class SettingsDialog(ThemedDialog):
         self.decrypt_button.clicked.connect(self.decrypt_and_import)
         encryption_layout.addWidget(self.decrypt_button)
         
+        # 只读查看按钮
+        self.view_archive_button = QPushButton("只读查看.jzrj文件")
+        self.view_archive_button.setStyleSheet("""
+            QPushButton {
+                background-color: #607D8B;
+                color: white;
+                border: none;
+                padding: 10px 15px;
+                border-radius: 4px;
+                font-size: 14px;
+                font-weight: 500;
+                text-align: left;
+                margin: 5px;
+            }
+            QPushButton:hover {
+                background-color: #546E7A;
+            }
+            QPushButton:pressed {
+                background-color: #455A64;
+            }
+        """)
+        self.view_archive_button.clicked.connect(self.view_encrypted_archive)
+        encryption_layout.addWidget(self.view_archive_button)
+        
+        # 更换密码按钮
+        self.change_password_button = QPushButton("更换.jzrj文件密码")
+        self.change_password_button.setStyleSheet(self.view_archive_button.styleSheet())
+        self.change_password_button.clicked.connect(self.change_archive_password)
+        encryption_layout.addWidget(self.change_password_button)
+        
         layout.addWidget(encryption_group)
+        
+        # 增量备份功能组
+        backup_group = QGroupBox("增量加密备份")
+        backup_group.setStyleSheet(encryption_group.styleSheet())
+        backup_layout = QHBoxLayout(backup_group)
+        
+        for text, color, slot in (
+            ("备份", "#009688", self.incremental_backup),
+            ("恢复", "#3F51B5", self.restore_backup_chain),
+            ("合并备份链", "#795548", self.compact_backup_chain),
+        ):
+            button = QPushButton(text)
+            button.setStyleSheet(f"""
+                QPushButton {{
+                    background-color: {color};
+                    color: white;
+                    border: none;
+                    padding: 10px 15px;
+                    border-radius: 4px;
+                    font-size: 14px;
+                    font-weight: 500;
+                    margin: 5px;
+                }}
+            """)
+            button.clicked.connect(slot)
+            backup_layout.addWidget(button)
+            
+        layout.addWidget(backup_group)
         layout.addStretch()
         
         return page
         
+    def create_rules_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(15)
+        
+        title_label = QLabel("记账规则")
+        title_label.setStyleSheet("""
+            font-size: 20px;
+            font-weight: bold;
+            color: #2d3949;
+            margin-bottom: 10px;
+        """)
+        layout.addWidget(title_label)
+        
+        hint_label = QLabel("文本中出现关键词时自动填入分类、收支类型或币种，留空的字段不设置；\n"
+                            "多条规则冲突时优先级高的生效。语音记账和批量文本记账都使用这些规则。")
+        hint_label.setStyleSheet("font-size: 12px; color: #6c757d;")
+        layout.addWidget(hint_label)
+        
+        self.rules_table = QTableWidget(0, len(self.RULE_COLUMNS))
+        self.rules_table.setHorizontalHeaderLabels(self.RULE_COLUMNS)
+        self.rules_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.rules_table.verticalHeader().hide()
+        for rule in self.parent_app.ledger_rules.rules:
+            self.append_rule_row(rule)
+        layout.addWidget(self.rules_table)
+        
+        button_layout = QHBoxLayout()
+        add_rule_btn = QPushButton("添加规则")
+        add_rule_btn.clicked.connect(lambda: self.append_rule_row(None, edit=True))
+        remove_rule_btn = QPushButton("删除选中规则")
+        remove_rule_btn.clicked.connect(self.remove_rule_rows)
+        save_rules_btn = QPushButton("保存规则")
+        save_rules_btn.clicked.connect(self.save_rules)
+        button_layout.addWidget(add_rule_btn)
+        button_layout.addWidget(remove_rule_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(save_rules_btn)
+        layout.addLayout(button_layout)
+        
+        return page
+        
+    def append_rule_row(self, rule, edit=False):
+        row = self.rules_table.rowCount()
+        self.rules_table.insertRow(row)
+        values = ("", "", "", "", "0") if rule is None else (
+            rule.keyword, rule.category or "", rule.type or "", rule.currency or "", str(rule.priority))
+        for column, value in enumerate(values):
+            self.rules_table.setItem(row, column, QTableWidgetItem(value))
+        if edit:
+            self.rules_table.scrollToBottom()
+            self.rules_table.editItem(self.rules_table.item(row, 0))
+            
+    def remove_rule_rows(self):
+        rows = sorted({index.row() for index in self.rules_table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.rules_table.removeRow(row)
+            
+    def save_rules(self):
+        """检查规则表并保存，保存后立即重新编译提取引擎"""
+        rules = []
+        keywords = set()
+        for row in range(self.rules_table.rowCount()):
+            values = [(self.rules_table.item(row, column).text().strip() if self.rules_table.item(row, column) else "")
+                      for column in range(len(self.RULE_COLUMNS))]
+            keyword, category, type_, currency, priority = values
+            if not any(values[:4]):
+                continue
+            if not keyword:
+                QMessageBox.warning(self, "错误", f"第 {row + 1} 行缺少关键词！")
+                return
+            if keyword in keywords:
+                QMessageBox.warning(self, "错误", f"关键词“{keyword}”重复！")
+                return
+            if type_ and type_ not in LedgerRules.TYPES:
+                QMessageBox.warning(self, "错误", f"第 {row + 1} 行的收支类型只能是“收入”或“支出”！")
+                return
+            if not (category or type_ or currency):
+                QMessageBox.warning(self, "错误", f"第 {row + 1} 行的规则没有设置任何字段！")
+                return
+            try:
+                priority = int(priority or 0)
+            except ValueError:
+                QMessageBox.warning(self, "错误", f"第 {row + 1} 行的优先级必须是整数！")
+                return
+            keywords.add(keyword)
+            rules.append(LedgerRule(keyword, category or None, type_ or None, currency or None, priority))
+            
+        try:
+            self.parent_app.reload_rules(rules)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "错误", f"保存规则失败: {e}")
+            return
+        QMessageBox.information(self, "记账规则", f"已保存 {len(rules)} 条规则，立即生效")
+        
     def create_shortcuts_page(self):
         page = QWidget()
         layout = QVBoxLayout(page)
@@ -1263,7 +4362,7 @@ class SettingsDialog(ThemedDialog):
             
             if file_dialog.exec():
                 file_path = file_dialog.selectedFiles()[0]
-                if self.file_manager.export_to_csv("accounting.db", file_path):
+                if self.file_manager.export_to_csv(self.parent_app.db_path, file_path):
                     QMessageBox.information(self, "导出成功", f"数据已成功导出到: {file_path}")
                 else:
                     QMessageBox.warning(self, "导出失败", "导出数据时发生错误！")
@@ -1283,7 +4382,7 @@ class SettingsDialog(ThemedDialog):
             
             if file_dialog.exec():
                 file_path = file_dialog.selectedFiles()[0]
-                if self.file_manager.import_from_csv("accounting.db", file_path):
+                if self.file_manager.import_from_csv(self.parent_app.db_path, file_path):
                     QMessageBox.information(self, "导入成功", f"数据已成功从: {file_path} 导入")
                     self.parent_app.load_records()  # 刷新记录
                 else:
@@ -1309,7 +4408,9 @@ class SettingsDialog(ThemedDialog):
                 
                 password, ok = QInputDialog.getText(self, "输入密码", "请输入加密密码:", QLineEdit.Password)
                 if ok and password:
-                    if self.file_manager.export_to_jzrj("accounting.db", original_file_name, password):
+                    codec = self.codec_combobox.currentText()
+                    level = int(self.level_combobox.currentText())
+                    if self.file_manager.export_to_jzrj(self.parent_app.db_path, original_file_name, password, codec, level):
                         QMessageBox.information(self, "加密导出成功", f"数据已成功加密导出到: {file_path}")
                     else:
                         QMessageBox.warning(self, "加密导出失败", "加密导出时发生错误！")
@@ -1318,6 +4419,19 @@ class SettingsDialog(ThemedDialog):
             print(f"加密导出时出错: {e}")
             QMessageBox.critical(self, "错误", f"加密导出时出错: {str(e)}")
             
+    def ask_archive_password(self, file_path, attempts=3):
+        """输入解密密码并立即用文件头校验，错误时可重新输入；返回正确的密码或None"""
+        for attempt in range(attempts, 0, -1):
+            password, ok = QInputDialog.getText(self, "输入密码", "请输入解密密码:", QLineEdit.Password)
+            if not (ok and password):
+                return None
+            if self.file_manager.check_jzrj_password(file_path, password):
+                return password
+            if attempt > 1:
+                QMessageBox.warning(self, "密码错误", f"密码错误，还可以重试 {attempt - 1} 次")
+        QMessageBox.warning(self, "密码错误", "密码错误次数过多")
+        return None
+        
     def decrypt_and_import(self):
         """从.jzrj文件解密导入"""
         try:
@@ -1330,9 +4444,9 @@ class SettingsDialog(ThemedDialog):
             if file_dialog.exec():
                 file_path = file_dialog.selectedFiles()[0]
                 
-                password, ok = QInputDialog.getText(self, "输入密码", "请输入解密密码:", QLineEdit.Password)
-                if ok and password:
-                    if self.file_manager.import_from_jzrj(file_path, password):
+                password = self.ask_archive_password(file_path)
+                if password:
+                    if self.file_manager.import_from_jzrj(file_path, password, self.parent_app.db_path):
                         QMessageBox.information(self, "解密导入成功", f"数据已成功从: {file_path} 解密导入")
                         self.parent_app.load_records()  # 刷新记录
                     else:
@@ -1342,6 +4456,108 @@ class SettingsDialog(ThemedDialog):
             print(f"解密导入时出错: {e}")
             QMessageBox.critical(self, "错误", f"解密导入时出错: {str(e)}")
 
+    def view_encrypted_archive(self):
+        """在新标签页中只读查看.jzrj文件"""
+        try:
+            file_dialog = QFileDialog()
+            file_dialog.setWindowTitle("只读查看.jzrj文件")
+            file_dialog.setLabelText(QFileDialog.Accept, "打开")
+            file_dialog.setNameFilter("JZRJ文件 (*.jzrj)")
+            file_dialog.setFileMode(QFileDialog.ExistingFile)
+            
+            if file_dialog.exec():
+                file_path = file_dialog.selectedFiles()[0]
+                if not JzrjArchiveReader.is_chunked(file_path):
+                    QMessageBox.warning(self, "无法查看", "旧版.jzrj文件不支持只读查看，请使用解密导入。")
+                    return
+                    
+                password = self.ask_archive_password(file_path)
+                if password:
+                    self.parent_app.open_jzrj_archive(file_path, password)
+                    self.accept()
+                    
+        except Exception as e:
+            print(f"打开加密归档时出错: {e}")
+            QMessageBox.critical(self, "错误", f"打开加密归档时出错: {str(e)}")
+
+    def change_archive_password(self):
+        """批量更换.jzrj文件密码，只改写密钥块"""
+        try:
+            file_paths, _ = QFileDialog.getOpenFileNames(self, "选择要更换密码的.jzrj文件", "", "JZRJ文件 (*.jzrj)")
+            if not file_paths:
+                return
+                
+            old_password, ok = QInputDialog.getText(self, "输入密码", "请输入原密码:", QLineEdit.Password)
+            if not (ok and old_password):
+                return
+            new_password, ok = QInputDialog.getText(self, "输入密码", "请输入新密码:", QLineEdit.Password)
+            if not (ok and new_password):
+                return
+                
+            results = self.file_manager.change_jzrj_password(file_paths, new_password, old_password)
+            failed = [os.path.basename(path) for path, ok in results.items() if not ok]
+            if failed:
+                QMessageBox.warning(self, "更换密码", "以下文件更换失败:\n" + "\n".join(failed))
+            else:
+                QMessageBox.information(self, "更换密码", f"已更换 {len(results)} 个文件的密码")
+                
+        except Exception as e:
+            print(f"更换密码时出错: {e}")
+            QMessageBox.critical(self, "错误", f"更换密码时出错: {str(e)}")
+            
+    def choose_backup_chain(self, title):
+        """选择备份目录并输入密码，取消时返回 (None, None)"""
+        backup_dir = QFileDialog.getExistingDirectory(self, title)
+        if not backup_dir:
+            return None, None
+        password, ok = QInputDialog.getText(self, "输入密码", "请输入备份密码:", QLineEdit.Password)
+        if not (ok and password):
+            return None, None
+        return BackupManager(backup_dir, self.file_manager), password
+        
+    def incremental_backup(self):
+        """完整备份或增量备份到选定目录"""
+        try:
+            manager, password = self.choose_backup_chain("选择备份目录")
+            if manager is None:
+                return
+            entry = manager.backup(self.parent_app.db_path, password,
+                                   self.codec_combobox.currentText(), int(self.level_combobox.currentText()))
+            kind = "完整备份" if entry['kind'] == 'base' else "增量备份"
+            QMessageBox.information(self, "备份成功", f"{kind}已写入: {entry['file']}（{entry['rows']} 条记录）")
+            
+        except Exception as e:
+            print(f"备份时出错: {e}")
+            QMessageBox.critical(self, "错误", f"备份时出错: {str(e)}")
+            
+    def restore_backup_chain(self):
+        """从备份链恢复账本"""
+        try:
+            manager, password = self.choose_backup_chain("选择备份目录")
+            if manager is None:
+                return
+            manager.restore(self.parent_app.db_path, password)
+            QMessageBox.information(self, "恢复成功", "已从备份链恢复账本")
+            self.parent_app.load_records()  # 刷新记录
+            
+        except Exception as e:
+            print(f"恢复备份时出错: {e}")
+            QMessageBox.critical(self, "错误", f"恢复备份时出错: {str(e)}")
+            
+    def compact_backup_chain(self):
+        """把备份链合并成新的完整备份"""
+        try:
+            manager, password = self.choose_backup_chain("选择备份目录")
+            if manager is None:
+                return
+            entry = manager.compact(password, self.codec_combobox.currentText(), int(self.level_combobox.currentText()),
+                                    self.parent_app.db_path)
+            QMessageBox.information(self, "合并成功", f"备份链已合并为: {entry['file']}")
+            
+        except Exception as e:
+            print(f"合并备份链时出错: {e}")
+            QMessageBox.critical(self, "错误", f"合并备份链时出错: {str(e)}")
+
 # 关于对话框
 class AboutDialog(ThemedDialog):
     def __init__(self, parent=None):
@@ -1446,6 +4662,7 @@ class PennAicoinMainWindow(QMainWindow):
         
         # 初始化数据库
         self.init_db()
+        self.extractor = LedgerExtractor(self.ledger_rules.rules, classifier=self.category_classifier)
         
         # 窗口基本设置
         self.setWindowTitle("PennAicoin 锦云策")
@@ -1478,25 +4695,45 @@ class PennAicoinMainWindow(QMainWindow):
         self.init_timer()
         self.init_shortcuts()
         
+        # 主窗口绘制完成后再在后台预热语音引擎，不阻塞启动
+        self.engine_warmup = EngineWarmup(resource_path(VOICE_MODEL_PATH), self.db_path, self)
+        self.engine_warmup.status_changed.connect(self.show_learned_terms)
+        self.engine_warmup.status_changed.connect(self.sync_category_model)
+        self.engine_warmup.status_changed.connect(self.register_rule_words)
+        QTimer.singleShot(0, self.engine_warmup.start)
+        
         # 加载记录
         self.load_records()
 
     def init_db(self):
         """初始化数据库"""
-        self.conn = sqlite3.connect('accounting.db')
+        self.db_path = 'accounting.db'
+        self.conn = sqlite3.connect(self.db_path)
         self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                amount REAL,
-                currency TEXT,
-                type TEXT,
-                category TEXT,
-                note TEXT
-            )
-        ''')
+        self.cursor.execute(RECORDS_TABLE_SQL)
         self.conn.commit()
+        self.category_classifier = CategoryClassifier(self.conn)
+        self.category_sync = CategoryModelSync(self.category_classifier, self.db_path, self)
+        self.ledger_rules = LedgerRules(self.conn)
+        
+    def reload_rules(self, rules=None):
+        """保存规则后重新编译提取引擎，不需要重启；rules 为None时从数据库重新读取"""
+        if rules is not None:
+            self.ledger_rules.save(rules)
+        else:
+            self.ledger_rules.load()
+        self.extractor.set_rules(self.ledger_rules.rules)
+        self.register_rule_words()
+        
+    def register_rule_words(self):
+        """规则关键词和分类加入分词用户词典；分词词典加载完成后再调用"""
+        if ledger_segmenter.loaded:
+            ledger_segmenter.add_words(self.ledger_rules.keywords() + self.ledger_rules.categories())
+        
+    def sync_category_model(self):
+        """在后台线程把账本的改动学习进分类模型；分词词典还没加载时先留在队列里"""
+        if ledger_segmenter.loaded:
+            self.category_sync.request(ledger_segmenter.lcut)
         
     def init_timer(self):
         """初始化定时器"""
@@ -1682,12 +4919,26 @@ class PennAicoinMainWindow(QMainWindow):
                 border: 1px solid #ffeeba;
                 padding: 6px 16px;
                 border-radius: 4px;
+                margin-right: 8px;
             }
             
             #modifyBtn:hover, #modifyBtn:pressed {
                 background-color: #ffeeba;
                 color: #856404;
             }
+            
+            #bulkTextBtn {
+                background-color: white;
+                color: #2d3949;
+                border: 1px solid #c8d9f2;
+                padding: 6px 16px;
+                border-radius: 4px;
+            }
+            
+            #bulkTextBtn:hover, #bulkTextBtn:pressed {
+                background-color: #c8d9f2;
+                color: #2a6bc5;
+            }
         """)
 
     def create_left_navigation(self):
@@ -1850,9 +5101,14 @@ class PennAicoinMainWindow(QMainWindow):
         self.modify_btn.setObjectName("modifyBtn")
         self.modify_btn.clicked.connect(self.modify_record)
         
+        self.bulk_text_btn = QPushButton("批量文本记账")
+        self.bulk_text_btn.setObjectName("bulkTextBtn")
+        self.bulk_text_btn.clicked.connect(self.show_bulk_text_dialog)
+        
         btn_layout.addWidget(self.create_btn)
         btn_layout.addWidget(self.delete_btn)
         btn_layout.addWidget(self.modify_btn)
+        btn_layout.addWidget(self.bulk_text_btn)
         btn_layout.addStretch()
         
         home_layout.addLayout(btn_layout)
@@ -1867,6 +5123,8 @@ class PennAicoinMainWindow(QMainWindow):
 
     def load_records(self):
         """从数据库加载记录并更新表格"""
+        # 所有改动账本的操作之后都会刷新表格，在这里顺带更新分类模型
+        self.sync_category_model()
         try:
             self.cursor.execute("SELECT * FROM records")
             records = self.cursor.fetchall()
@@ -1951,6 +5209,11 @@ class PennAicoinMainWindow(QMainWindow):
         dialog = AddRecordDialog(self)
         dialog.exec()
 
+    def show_bulk_text_dialog(self):
+        """显示批量文本记账对话框"""
+        dialog = BulkTextDialog(self)
+        dialog.exec()
+
     def modify_record(self):
         """修改选中的记录"""
         selected_row = self.table_widget.currentRow()
@@ -1991,111 +5254,93 @@ class PennAicoinMainWindow(QMainWindow):
             self.conn.commit()
             self.load_records()
 
-    def process_voice_input(self, recognized_text):
-        """处理语音输入"""
-        print("处理语音输入...")
-        if recognized_text:
-            print("识别到的语音:", recognized_text)
-            words = jieba.lcut(recognized_text)
-            
-            date = self.extract_date(words)
-            amount = self.extract_amount(words)
-            currency = self.extract_currency(words)
-            type_ = self.extract_type(words)
-            category = self.extract_category(words)
-            note = self.extract_note(words)
-            
-            # 显示识别结果并添加记录
-            QMessageBox.information(self, "语音识别结果", 
-                                   f"识别内容: {recognized_text}\n\n"
-                                   f"将添加记录:\n"
-                                   f"日期: {date}\n"
-                                   f"金额: {amount}\n"
-                                   f"币种: {currency}\n"
-                                   f"类型: {type_}\n"
-                                   f"分类: {category}")
-            
-            self.add_record(date, amount, currency, type_, category, note)
-        else:
-            print("未识别到有效内容")
-            QMessageBox.warning(self, "语音识别", "未识别到有效内容")
-
-    def extract_date(self, words):
-        """从语音中提取日期"""
-        date_pattern = re.compile(r'\d{4}年\d{1,2}月\d{1,2}日')
-        for word in words:
-            if date_pattern.match(word):
-                return word.replace('年', '-').replace('月', '-').replace('日', '')
-        return QDate.currentDate().toString("yyyy-MM-dd")
-
-    def extract_amount(self, words):
-        """从语音中提取金额"""
-        amount_pattern = re.compile(r'\d+\.?\d*')
-        for word in words:
-            match = amount_pattern.findall(word)
-            if match:
-                return float(match[0])
-        return 0.0
-
-    def extract_currency(self, words):
-        """从语音中提取币种"""
-        currency_map = {
-            '人民币': '人民币 (CNY)',
-            '美元': '美元 (USD)',
-            '欧元': '欧元 (EUR)',
-            '日元': '日元 (JPY)'
-        }
-        for word in words:
-            if word in currency_map:
-                return currency_map[word]
-        return '人民币 (CNY)'
-
-    def extract_type(self, words):
-        """从语音中提取收支类型"""
-        if '收入' in words:
-            return '收入'
-        elif '支出' in words:
-            return '支出'
-        else:
-            return '支出'
-
-    def extract_category(self, words):
-        """从语音中提取分类"""
-        category_map = {
-            '工资': '工资收入',
-            '奖金': '奖金收入',
-            '投资': '投资收益',
-            '兼职': '兼职收入',
-            '餐饮': '餐饮',
-            '购物': '购物',
-            '交通': '交通',
-            '住房': '住房',
-            '娱乐': '娱乐',
-            '医疗': '医疗'
-        }
-        for word in words:
-            if word in category_map:
-                return category_map[word]
-        return '其他'
+    def extract_record(self, text):
+        """把一段识别文本转换为 (日期, 金额, 币种, 类型, 分类, 备注)"""
+        return self.extractor.extract_record(text)
+
+    def import_transcripts(self, results):
+        """把批量转写的结果提取为记录，在一个事务中批量写入，返回添加的条数"""
+        rows = []
+        for result in results:
+            result['record'] = None
+            if result['error'] or not result['text']:
+                continue
+            result['record'] = self.extract_record(result['text'])
+            rows.append(result['record'])
+        if not rows:
+            return 0
+        try:
+            return self.add_records(rows)
+        except sqlite3.Error as e:
+            print(f"批量添加记录时出错: {e}")
+            for result in results:
+                result['record'] = None
+                if not result['error'] and result['text']:
+                    result['error'] = str(e)
+            return 0
+
+    def frequent_note_words(self, limit=50):
+        """账本备注中最常出现的词，加入受限识别的短语表"""
+        counts = {}
+        self.cursor.execute("SELECT note, COUNT(*) FROM records WHERE note != '' GROUP BY note ORDER BY COUNT(*) DESC LIMIT 200")
+        for note, count in self.cursor.fetchall():
+            for word in ledger_segmenter.lcut(str(note)):
+                word = word.strip()
+                if len(word) > 1:
+                    counts[word] = counts.get(word, 0) + count
+        return sorted(counts, key=counts.get, reverse=True)[:limit]
 
-    def extract_note(self, words):
-        """从语音中提取备注"""
-        return ' '.join(words)
+    def voice_grammar(self):
+        return build_ledger_grammar(self.ledger_rules.keywords() + self.frequent_note_words())
 
-    def add_record(self, date, amount, currency, type_, category, note):
+    def measure(self, timings, stage):
+        """timings 为 None 时不计时；只有语音记账的调用传入 voice_timings，其他途径的添加不计入语音耗时统计"""
+        return timings.measure(stage) if timings is not None else nullcontext()
+
+    def add_record(self, date, amount, currency, type_, category, note, timings=None):
         """添加记录到数据库"""
         print("添加记录到数据库...")
         try:
-            self.cursor.execute(
+            with self.measure(timings, 'db_insert'):
+                self.cursor.execute(
+                    "INSERT INTO records (date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?)",
+                    (date, amount, currency, type_, category, note)
+                )
+                self.conn.commit()
+            with self.measure(timings, 'table_refresh'):
+                self.load_records()
+            self.learn_note_terms([(note, 1)])
+        except Exception as e:
+            print(f"添加记录时出错: {str(e)}")
+
+    def add_records(self, rows, timings=None):
+        """在一个事务中批量添加记录，表格只刷新一次；出错时整体回滚并抛出 sqlite3.Error"""
+        with self.measure(timings, 'db_insert'), self.conn:
+            self.conn.executemany(
                 "INSERT INTO records (date, amount, currency, type, category, note) VALUES (?,?,?,?,?,?)",
-                (date, amount, currency, type_, category, note)
+                rows
             )
-            self.conn.commit()
+        with self.measure(timings, 'table_refresh'):
             self.load_records()
-        except Exception as e:
-            print(f"添加记录时出错: {str(e)}")
+        self.learn_note_terms([(row[5], 1) for row in rows])
+        return len(rows)
 
-    def add_new_tab(self, title, file_type=None, file_path=None):
+    def learn_note_terms(self, note_counts):
+        """把新添加记录的备注中反复出现的词加入分词用户词典。整个账本由预热线程扫描，
+        扫描完成前跳过，扫描会包含这些记录"""
+        if not self.engine_warmup.ready['jieba']:
+            return
+        added = ledger_segmenter.learn(note_counts)
+        if added:
+            print(f"用户词典新增: {' '.join(added)}")
+            
+    def show_learned_terms(self):
+        """预热线程扫描账本学到的新词只报告一次"""
+        added, self.engine_warmup.learned_terms = self.engine_warmup.learned_terms, []
+        if added:
+            print(f"用户词典新增: {' '.join(added)}")
+
+    def add_new_tab(self, title, file_type=None, file_path=None, archive=None):
         """添加新的标签页"""
         # 创建标签页内容
         tab_content = QWidget()
@@ -2108,7 +5353,17 @@ class PennAicoinMainWindow(QMainWindow):
             layout.addWidget(welcome_label)
         else:
             # 根据文件类型显示不同内容
-            if file_type == "csv" or file_type == "jzrj":
+            if file_type == "jzrj" and archive is not None:
+                # 只读查看加密归档，按视口按需解密
+                file_table = QTableView()
+                file_table.setModel(JzrjArchiveTableModel(archive, file_table))
+                file_table.setEditTriggers(QTableView.NoEditTriggers)
+                file_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+                # 固定行高，避免视图为计算行高而遍历全部行
+                file_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+                layout.addWidget(file_table)
+                tab_content.archive = archive
+            elif file_type == "csv" or file_type == "jzrj":
                 # 创建表格显示文件内容
                 file_table = QTableWidget()
                 file_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
@@ -2122,18 +5377,33 @@ class PennAicoinMainWindow(QMainWindow):
         
         return tab_index
 
+    def open_jzrj_archive(self, file_path, password):
+        """以只读标签页打开.jzrj归档"""
+        file_manager = FileManager(file_path)
+        archive = file_manager.open_jzrj(file_path, password)
+        return self.add_new_tab(os.path.basename(file_path), "jzrj", file_path, archive=archive)
+
     def close_tab(self, index):
         """关闭标签页"""
+        tab_content = self.tab_widget.widget(index)
+        archive = getattr(tab_content, "archive", None)
         if self.tab_widget.count() > 1:  # 确保至少保留一个标签页
             self.tab_widget.removeTab(index)
         else:
             # 如果只剩一个标签页，重置为欢迎页
             self.tab_widget.clear()
             self.add_new_tab("欢迎使用", "welcome")
+            
+        # 标签页确实被移除后才关闭归档，仍在显示的表格不能读到已关闭的文件
+        if archive is not None and self.tab_widget.indexOf(tab_content) == -1:
+            archive.close()
 
 
 # 主程序入口
 if __name__ == "__main__":
+    # 打包后的程序启动批量转写的工作进程时需要
+    multiprocessing.freeze_support()
+    
     # 确保中文显示正常
     font = QFont("Source Han Sans CN", 10)
     